@@ -26,6 +26,7 @@ setup(
     package_dir={'': 'src'},
     packages=[
         'pycalendar',
+        'pycalendar.benchmarks',
         'pycalendar.icalendar',
         'pycalendar.vcard',
         'zonal',
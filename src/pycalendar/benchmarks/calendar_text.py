@@ -0,0 +1,121 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Measure how quickly a calendar with many EXDATEs is turned back into text.
+
+    python -m pycalendar.benchmarks.calendar_text [options]
+"""
+
+from pycalendar.benchmarks.calendars import VTIMEZONE
+from pycalendar.datetime import DateTime
+from pycalendar.icalendar.calendar import Calendar
+import cStringIO as StringIO
+import getopt
+import sys
+import time
+
+
+def generateCalendar(events, exdates):
+    """
+    Generate the text of a calendar with daily events each with the specified number of
+    EXDATEs.
+
+    @param events: number of events
+    @type events: L{int}
+    @param exdates: number of EXDATEs in each event
+    @type exdates: L{int}
+    @rtype: L{str}
+    """
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//example.com//Benchmark//EN",
+        VTIMEZONE.strip(),
+    ]
+    for i in range(events):
+        start = DateTime(2012, 1, 1 + i % 28, 9, 0, 0)
+        lines.append("BEGIN:VEVENT")
+        lines.append("UID:event-%d@example.com" % (i,))
+        lines.append("DTSTAMP:20150101T000000Z")
+        lines.append("DTSTART;TZID=America/New_York:%s" % (start.getText(),))
+        lines.append("DURATION:PT1H")
+        lines.append("RRULE:FREQ=DAILY")
+        excluded = []
+        for _ignore in range(exdates):
+            start.offsetDay(3)
+            excluded.append(start.getText())
+        lines.append("EXDATE;TZID=America/New_York:%s" % (",".join(excluded),))
+        lines.append("SUMMARY:Event %d" % (i,))
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def usage(error_msg=None):
+    if error_msg:
+        print error_msg
+
+    print """Usage: calendar_text [options]
+Options:
+    -h            Print this help and exit
+    --events      Number of events in the calendar
+    --exdates     Number of EXDATEs in each event
+    --count       Number of times to generate the text
+
+Description:
+    This utility will report the time taken to generate the text of
+    a calendar whose events have large numbers of EXDATEs.
+
+"""
+
+    if error_msg:
+        raise ValueError(error_msg)
+    else:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+
+    events = 100
+    exdates = 200
+    count = 10
+
+    options, args = getopt.getopt(sys.argv[1:], "h", ["events=", "exdates=", "count=", ])
+
+    for option, value in options:
+        if option == "-h":
+            usage()
+        elif option == "--events":
+            events = int(value)
+        elif option == "--exdates":
+            exdates = int(value)
+        elif option == "--count":
+            count = int(value)
+        else:
+            usage("Unrecognized option: %s" % (option,))
+
+    cal = Calendar()
+    cal.parse(StringIO.StringIO(generateCalendar(events, exdates)))
+
+    start = time.time()
+    for _ignore in xrange(count):
+        cal.getText()
+    elapsed = time.time() - start
+    print "Generated %d events with %d EXDATEs %d times: %.3f secs (%.1f ms each)" % (
+        events, exdates, count, elapsed, elapsed * 1000 / count,
+    )
@@ -0,0 +1,120 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Calendar data used by the benchmarks.
+"""
+
+from pycalendar.icalendar.calendar import Calendar
+import cStringIO as StringIO
+
+VTIMEZONE = """BEGIN:VTIMEZONE
+TZID:America/New_York
+BEGIN:DAYLIGHT
+TZOFFSETFROM:-0500
+TZOFFSETTO:-0400
+TZNAME:EDT
+DTSTART:20070311T020000
+RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU
+END:DAYLIGHT
+BEGIN:STANDARD
+TZOFFSETFROM:-0400
+TZOFFSETTO:-0500
+TZNAME:EST
+DTSTART:20071104T020000
+RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU
+END:STANDARD
+END:VTIMEZONE
+"""
+
+# A mix of the kinds of events found in a typical calendar
+RULES = (
+    None,
+    None,
+    None,
+    "FREQ=DAILY;COUNT=10",
+    "FREQ=WEEKLY",
+    "FREQ=WEEKLY;BYDAY=MO,WE,FR",
+    "FREQ=WEEKLY;INTERVAL=2;BYDAY=TU",
+    "FREQ=MONTHLY;BYDAY=2TH",
+    "FREQ=MONTHLY;BYMONTHDAY=1",
+    "FREQ=YEARLY",
+)
+
+
+def generateCalendar(events, start_year, years):
+    """
+    Generate the text of a calendar with one-off and recurring events spread over the specified
+    years, most of them in a time zone with daylight saving time.
+
+    @param events: number of events
+    @type events: L{int}
+    @param start_year: first year of the events
+    @type start_year: L{int}
+    @param years: number of years the events start in
+    @type years: L{int}
+    @rtype: L{str}
+    """
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//example.com//Benchmark//EN",
+        VTIMEZONE.strip(),
+    ]
+    for i in range(events):
+        year = start_year + i % years
+        month = 1 + i % 12
+        day = 1 + (i * 7) % 28
+        hour = 8 + i % 10
+        lines.append("BEGIN:VEVENT")
+        lines.append("UID:event-%d@example.com" % (i,))
+        lines.append("DTSTAMP:20150101T000000Z")
+        if i % 10 == 9:
+            # All-day
+            params = ";VALUE=DATE"
+            value = "%04d%02d%02d"
+            lines.append("DURATION:P1D")
+        elif i % 7 == 6:
+            params = ""
+            value = "%04d%02d%02dT" + "%02d0000Z" % (hour,)
+            lines.append("DURATION:PT30M")
+        else:
+            params = ";TZID=America/New_York"
+            value = "%04d%02d%02dT" + "%02d0000" % (hour,)
+            lines.append("DURATION:PT1H")
+        lines.append("DTSTART%s:%s" % (params, value % (year, month, day,),))
+        rule = RULES[i % len(RULES)]
+        if rule is not None:
+            lines.append("RRULE:%s" % (rule,))
+            if i % 3 == 0:
+                lines.append("EXDATE%s:%s" % (params, value % (year + 1, month, day,),))
+        lines.append("SUMMARY:Event %d" % (i,))
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def loadCalendar(events, start_year, years):
+    """
+    Parse a generated calendar (see L{generateCalendar}).
+
+    @rtype: L{Calendar}
+    """
+
+    cal = Calendar()
+    cal.parse(StringIO.StringIO(generateCalendar(events, start_year, years)))
+    return cal
@@ -0,0 +1,136 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Measure how quickly lists of L{DateTime} objects can be sorted and bisected.
+
+    python -m pycalendar.benchmarks.datetime_compare [options]
+"""
+
+from pycalendar.datetime import DateTime
+from pycalendar.timezone import Timezone
+import bisect
+import getopt
+import random
+import sys
+import time
+
+
+def generateValues(count, tzid=None, seed=0):
+    """
+    Generate date-times at random seconds over a number of years.
+
+    @param count: number of values
+    @type count: L{int}
+    @param tzid: time zone of the values, or C{None} for floating
+    @type tzid: L{Timezone}
+    @param seed: random number seed
+    @type seed: L{int}
+    @rtype: L{list} of L{DateTime}
+    """
+
+    rand = random.Random(seed)
+    values = []
+    for _ignore in xrange(count):
+        dt = DateTime(2012, 1, 1, 0, 0, 0, tzid=tzid)
+        dt.offsetSeconds(rand.randint(0, 4 * 365 * 86400))
+        values.append(dt)
+    return values
+
+
+def timeCall(call, repeat):
+    """
+    Best time, in seconds, of a number of calls.
+    """
+
+    best = None
+    for _ignore in xrange(repeat):
+        start = time.time()
+        call()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def usage(error_msg=None):
+    if error_msg:
+        print error_msg
+
+    print """Usage: datetime_compare [options]
+Options:
+    -h            Print this help and exit
+    --count       Number of values to sort
+    --lookups     Number of values to bisect for
+    --repeat      Number of times to repeat each measurement
+
+Description:
+    This utility will report the time taken to sort lists of UTC and
+    floating DateTime values, both with comparisons and with a key,
+    and to bisect sorted lists. Floating values are measured both
+    with and without the default timezone pinned.
+
+"""
+
+    if error_msg:
+        raise ValueError(error_msg)
+    else:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+
+    count = 100000
+    lookups = 10000
+    repeat = 3
+
+    options, args = getopt.getopt(sys.argv[1:], "h", ["count=", "lookups=", "repeat=", ])
+
+    for option, value in options:
+        if option == "-h":
+            usage()
+        elif option == "--count":
+            count = int(value)
+        elif option == "--lookups":
+            lookups = int(value)
+        elif option == "--repeat":
+            repeat = int(value)
+        else:
+            usage("Unrecognized option: %s" % (option,))
+
+    for name, tzid, pinned in (("UTC", Timezone(utc=True), False), ("floating", None, False), ("floating pinned", None, True),):
+        values = generateValues(count, tzid)
+        probes = generateValues(lookups, tzid, seed=1)
+
+        if pinned:
+            context = Timezone.pinnedDefault()
+            context.__enter__()
+
+        elapsed = timeCall(lambda: sorted(values, cmp=DateTime.sort), repeat)
+        print "%s: sort %d with compareDateTime: %.3f secs" % (name, count, elapsed,)
+        elapsed = timeCall(lambda: sorted(values), repeat)
+        print "%s: sort %d with comparisons: %.3f secs" % (name, count, elapsed,)
+        elapsed = timeCall(lambda: sorted(values, key=DateTime.sortKey(values)), repeat)
+        print "%s: sort %d with sortKey: %.3f secs" % (name, count, elapsed,)
+        elapsed = timeCall(lambda: sorted(values, key=DateTime.getPosixTime), repeat)
+        print "%s: sort %d by posix time: %.3f secs" % (name, count, elapsed,)
+
+        ordered = sorted(values)
+        elapsed = timeCall(lambda: [bisect.bisect_left(ordered, probe) for probe in probes], repeat)
+        print "%s: bisect %d in %d: %.3f secs" % (name, lookups, count, elapsed,)
+
+        if pinned:
+            context.__exit__(None, None, None)
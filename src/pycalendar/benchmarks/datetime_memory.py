@@ -0,0 +1,111 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Measure the memory used by L{DateTime} objects when a multi-year calendar is parsed and
+expanded.
+
+    python -m pycalendar.benchmarks.datetime_memory [options]
+"""
+
+from pycalendar.benchmarks.calendars import loadCalendar
+from pycalendar.datetime import DateTime
+from pycalendar.period import Period
+from pycalendar.timezone import Timezone
+import gc
+import getopt
+import sys
+
+
+def dateTimeMemory():
+    """
+    Count the live L{DateTime} objects and the memory they use, including any per-instance
+    dictionary.
+
+    @return: the number of objects and total size in bytes
+    @rtype: L{tuple} of (L{int}, L{int})
+    """
+
+    gc.collect()
+    count = 0
+    size = 0
+    for obj in gc.get_objects():
+        if isinstance(obj, DateTime):
+            count += 1
+            size += sys.getsizeof(obj)
+            if hasattr(obj, "__dict__"):
+                size += sys.getsizeof(obj.__dict__)
+    return count, size
+
+
+def usage(error_msg=None):
+    if error_msg:
+        print error_msg
+
+    print """Usage: datetime_memory [options]
+Options:
+    -h            Print this help and exit
+    --events      Number of events in the calendar
+    --start       Start year
+    --years       Number of years to expand over
+
+Description:
+    This utility will report the number of DateTime objects, and the
+    memory they use, after parsing a generated calendar and expanding
+    all of its events over the requested years.
+
+"""
+
+    if error_msg:
+        raise ValueError(error_msg)
+    else:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+
+    events = 2000
+    startYear = 2012
+    years = 4
+
+    options, args = getopt.getopt(sys.argv[1:], "h", ["events=", "start=", "years=", ])
+
+    for option, value in options:
+        if option == "-h":
+            usage()
+        elif option == "--events":
+            events = int(value)
+        elif option == "--start":
+            startYear = int(value)
+        elif option == "--years":
+            years = int(value)
+        else:
+            usage("Unrecognized option: %s" % (option,))
+
+    cal = loadCalendar(events, startYear, years)
+    count, size = dateTimeMemory()
+    print "Parsed %d events: %d DateTimes, %d KB" % (events, count, size / 1024,)
+
+    period = Period(
+        DateTime(startYear, 1, 1, 0, 0, 0, tzid=Timezone(utc=True)),
+        DateTime(startYear + years, 1, 1, 0, 0, 0, tzid=Timezone(utc=True)),
+    )
+    instances = []
+    cal.getVEvents(period, instances)
+    count, size = dateTimeMemory()
+    print "Expanded %d instances over %d years: %d DateTimes, %d KB (%d bytes each)" % (
+        len(instances), years, count, size / 1024, size / max(count, 1),
+    )
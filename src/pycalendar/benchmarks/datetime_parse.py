@@ -0,0 +1,149 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Measure how quickly the date-time property values of a calendar are parsed.
+
+    python -m pycalendar.benchmarks.datetime_parse [options] [FILE ...]
+"""
+
+from pycalendar.benchmarks.calendars import generateCalendar
+from pycalendar.datetime import DateTime
+from pycalendar.icalendar.calendar import Calendar
+import cStringIO as StringIO
+import getopt
+import sys
+import time
+
+# Properties whose values are (lists of) date-times or dates
+DATETIME_PROPERTIES = (
+    "COMPLETED",
+    "CREATED",
+    "DTEND",
+    "DTSTAMP",
+    "DTSTART",
+    "DUE",
+    "EXDATE",
+    "LAST-MODIFIED",
+    "RDATE",
+    "RECURRENCE-ID",
+)
+
+
+def dateTimeValues(data):
+    """
+    Extract the date-time property values from the text of a calendar.
+
+    @param data: calendar text
+    @type data: L{str}
+    @rtype: L{list} of L{str}
+    """
+
+    values = []
+    for line in data.replace("\r\n ", "").replace("\n ", "").splitlines():
+        name, _ignore_sep, value = line.partition(":")
+        if name.split(";")[0].upper() in DATETIME_PROPERTIES and "VALUE=PERIOD" not in name.upper():
+            values.extend(value.split(","))
+    return values
+
+
+def timeParse(parse, values, repeat):
+    """
+    Best time, in seconds, to parse all the values.
+    """
+
+    best = None
+    for _ignore in xrange(repeat):
+        start = time.time()
+        for value in values:
+            parse(DateTime(), value)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def usage(error_msg=None):
+    if error_msg:
+        print error_msg
+
+    print """Usage: datetime_parse [options] [FILE ...]
+Options:
+    -h            Print this help and exit
+    --events      Number of events in the generated calendar
+    --repeat      Number of times to repeat each measurement
+
+Arguments:
+    FILE          iCalendar files to use instead of a generated calendar
+
+Description:
+    This utility will report the time taken to parse the DTSTART,
+    DTEND, DTSTAMP, RECURRENCE-ID, EXDATE etc values of the calendar
+    data, with the fixed width fast path and with the general parser,
+    as well as the time taken to parse the whole calendar.
+
+"""
+
+    if error_msg:
+        raise ValueError(error_msg)
+    else:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+
+    events = 2000
+    repeat = 3
+
+    options, args = getopt.getopt(sys.argv[1:], "h", ["events=", "repeat=", ])
+
+    for option, value in options:
+        if option == "-h":
+            usage()
+        elif option == "--events":
+            events = int(value)
+        elif option == "--repeat":
+            repeat = int(value)
+        else:
+            usage("Unrecognized option: %s" % (option,))
+
+    if args:
+        datas = []
+        for arg in args:
+            with open(arg) as f:
+                datas.append(f.read())
+    else:
+        datas = [generateCalendar(events, 2012, 4)]
+
+    values = []
+    for data in datas:
+        values.extend(dateTimeValues(data))
+    print "%d date-time values" % (len(values),)
+
+    elapsed = timeParse(DateTime.parseGeneral, values, repeat)
+    print "General parser: %.3f secs (%.1f usecs each)" % (elapsed, elapsed * 1000000 / max(len(values), 1),)
+    elapsed = timeParse(DateTime.parse, values, repeat)
+    print "With fast path: %.3f secs (%.1f usecs each)" % (elapsed, elapsed * 1000000 / max(len(values), 1),)
+
+    best = None
+    for _ignore in xrange(repeat):
+        start = time.time()
+        for data in datas:
+            Calendar().parse(StringIO.StringIO(data))
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print "Whole calendar parse: %.3f secs" % (best,)
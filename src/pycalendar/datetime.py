@@ -20,6 +20,7 @@ from pycalendar.duration import Duration
 from pycalendar.icalendar import definitions
 from pycalendar.parser import ParserContext
 from pycalendar.timezone import Timezone
+from pycalendar.timezonedb import TimezoneDatabase
 from pycalendar.valueutils import ValueMixin
 import cStringIO as StringIO
 import time
@@ -27,6 +28,13 @@ import xml.etree.cElementTree as XML
 
 
 class DateTime(ValueMixin):
+    """
+    A date or date-time value. Values are changed in place (e.g. by L{offsetDay} or
+    L{adjustTimezone}) and many are handed on to callers that go on to change them, so a value
+    that is kept or shared has to be copied with L{duplicate}. There is deliberately no
+    immutable (copy-on-write) variant: a caller ignoring the new value returned by one of its
+    setters would silently lose the change.
+    """
 
     SUNDAY = 0
     MONDAY = 1
@@ -43,6 +51,29 @@ class DateTime(ValueMixin):
     ABBREVDATENOYEAR = 4
     NUMERICDATENOYEAR = 5
 
+    # Large numbers of these are created (e.g. by recurrence expansion and time zone lookups)
+    # so avoid a per-instance __dict__
+    __slots__ = (
+        "mYear",
+        "mMonth",
+        "mDay",
+        "mHours",
+        "mMinutes",
+        "mSeconds",
+        "mDateOnly",
+        "mTZUTC",
+        "mTZID",
+        "mTZOffset",
+        "mPosixTimeCached",
+        "mPosixTime",
+        "mLocalKey",
+        "mDefaultGeneration",
+        "mText",
+    )
+
+    # The value of each pair of digits, used by L{parseFixed}
+    cDigitPairs = dict([("%02d" % (i,), i) for i in range(100)])
+
     @staticmethod
     def sort(e1, e2):
 
@@ -92,9 +123,30 @@ class DateTime(ValueMixin):
 
         self.mPosixTimeCached = False
         self.mPosixTime = 0
+        self.mLocalKey = None
+        self.mDefaultGeneration = 0
+        self.mText = None
+
+    def __getstate__(self):
+        return dict([(attr, getattr(self, attr)) for attr in DateTime.__slots__])
+
+    def __setstate__(self, state):
+        self.mLocalKey = None
+        self.mDefaultGeneration = 0
+        self.mText = None
+        for attr, value in state.items():
+            setattr(self, attr, value)
 
     def duplicate(self):
-        other = DateTime(self.mYear, self.mMonth, self.mDay, self.mHours, self.mMinutes, self.mSeconds)
+        # Copy the attributes directly rather than via __init__
+        other = DateTime.__new__(DateTime)
+
+        other.mYear = self.mYear
+        other.mMonth = self.mMonth
+        other.mDay = self.mDay
+        other.mHours = self.mHours
+        other.mMinutes = self.mMinutes
+        other.mSeconds = self.mSeconds
 
         other.mDateOnly = self.mDateOnly
 
@@ -104,6 +156,9 @@ class DateTime(ValueMixin):
 
         other.mPosixTimeCached = self.mPosixTimeCached
         other.mPosixTime = self.mPosixTime
+        other.mLocalKey = self.mLocalKey
+        other.mDefaultGeneration = self.mDefaultGeneration
+        other.mText = self.mText
 
         return other
 
@@ -120,10 +175,10 @@ class DateTime(ValueMixin):
 
     # Operators
     def __add__(self, duration):
-        # Add duration seconds to temp object and normalise it
+        # Add the exact (hours, minutes and seconds) and nominal (days and weeks) parts of the
+        # duration to a temp object
         result = self.duplicate()
-        result.mSeconds += duration.getTotalSeconds()
-        result.normalise()
+        result.addSeconds(duration.getExactSeconds(), duration.getNominalDays())
         return result
 
     def __sub__(self, dateorduration):
@@ -163,69 +218,129 @@ class DateTime(ValueMixin):
 
             duration = dateorduration
             result = self.duplicate()
-            result.mSeconds -= duration.getTotalSeconds()
-            result.normalise()
+            result.addSeconds(-duration.getExactSeconds(), -duration.getNominalDays())
             return result
 
         raise ValueError("DateTime: cannot subtract: {}".format(dateorduration))
 
     # Comparators
     def __eq__(self, comp):
-        return self.compareDateTime(comp) == 0
+        key1, key2 = self.comparisonKeys(comp)
+        return key1 == key2
 
     def __ne__(self, comp):
-        return self.compareDateTime(comp) != 0
+        key1, key2 = self.comparisonKeys(comp)
+        return key1 != key2
 
     def __ge__(self, comp):
-        return self.compareDateTime(comp) >= 0
+        key1, key2 = self.comparisonKeys(comp)
+        return key1 >= key2
 
     def __le__(self, comp):
-        return self.compareDateTime(comp) <= 0
+        key1, key2 = self.comparisonKeys(comp)
+        return key1 <= key2
 
     def __gt__(self, comp):
-        return self.compareDateTime(comp) > 0
+        key1, key2 = self.comparisonKeys(comp)
+        return key1 > key2
 
     def __lt__(self, comp):
-        return self.compareDateTime(comp) < 0
+        key1, key2 = self.comparisonKeys(comp)
+        return key1 < key2
 
     def compareDateTime(self, comp):
+        key1, key2 = self.comparisonKeys(comp)
+        return cmp(key1, key2)
+
+    def comparisonKeys(self, comp):
+        """
+        The integer keys that order this value relative to another one.
+
+        @param comp: the value to compare with
+        @type comp: L{DateTime} or C{None}
+        @return: the key for this value and the key for L{comp}
+        @rtype: L{tuple} of (L{int}, L{int})
+        """
+        # Anything is greater than nothing
         if comp is None:
-            return 1
+            return 1, 0
+
+        key1 = self.mLocalKey
+        if key1 is None:
+            key1 = self.getLocalKey()
+        key2 = comp.mLocalKey
+        if key2 is None:
+            key2 = comp.getLocalKey()
+
         # If either are date only, then just do date compare
         if self.mDateOnly or comp.mDateOnly:
-            c = cmp(self.mYear, comp.mYear)
-            if c == 0:
-                c = cmp(self.mMonth, comp.mMonth)
-                if c == 0:
-                    c = cmp(self.mDay, comp.mDay)
-            return c
+            return key1 / 86400, key2 / 86400
 
         # If they have the same timezone do simple compare - no posix calc
         # needed
-        elif (Timezone.same(self.mTZUTC, self.mTZID, comp.mTZUTC, comp.mTZID)):
-            c = cmp(self.mYear, comp.mYear)
-            if c == 0:
-                c = cmp(self.mMonth, comp.mMonth)
-                if c == 0:
-                    c = cmp(self.mDay, comp.mDay)
-                    if c == 0:
-                        c = cmp(self.mHours, comp.mHours)
-                        if c == 0:
-                            c = cmp(self.mMinutes, comp.mMinutes)
-                            if c == 0:
-                                c = cmp(self.mSeconds, comp.mSeconds)
-            return c
+        elif (self.mTZUTC == comp.mTZUTC and self.mTZID == comp.mTZID) or Timezone.same(self.mTZUTC, self.mTZID, comp.mTZUTC, comp.mTZID):
+            return key1, key2
 
         else:
-            return cmp(self.getPosixTime(), comp.getPosixTime())
+            return self.getPosixTime(), comp.getPosixTime()
+
+    def getLocalKey(self):
+        """
+        An integer that orders values by their local date and time, ignoring the time zone. The
+        date part, as given by L{utils.packDate}, is the key divided by the number of seconds in a
+        day. The value is cached until the date or time is changed.
+
+        @rtype: L{int}
+        """
+        if self.mLocalKey is None:
+            self.mLocalKey = utils.packDate(self.mYear, self.mMonth, self.mDay) * 86400 + (self.mHours * 60 + self.mMinutes) * 60 + self.mSeconds
+        return self.mLocalKey
+
+    def getOffsetKey(self):
+        """
+        The key to look up the UTC offset of this value with: L{getLocalKey}, except that as a
+        date-only value is after any transition on the same day it is the key of the last
+        second of the day.
+
+        @rtype: L{int}
+        """
+        key = self.getLocalKey()
+        if self.mDateOnly:
+            key = (key / 86400) * 86400 + 86399
+        return key
+
+    @staticmethod
+    def sortKey(values):
+        """
+        The key function to use to sort or bisect a list of values: L{getLocalKey} when all the
+        values are in the same time zone (or are floating), otherwise L{getPosixTime}.
+
+        @param values: the values to be ordered
+        @type values: iterable of L{DateTime}
+        @return: the key function
+        @rtype: C{callable}
+        """
+        tz = None
+        for value in values:
+            if value.mDateOnly or value.floating():
+                continue
+            if tz is None:
+                tz = (value.mTZUTC, value.mTZID,)
+            elif not Timezone.same(value.mTZUTC, value.mTZID, tz[0], tz[1]):
+                return DateTime.getPosixTime
+        return DateTime.getLocalKey
 
     def compareDate(self, comp):
         return (self.mYear == comp.mYear) and (self.mMonth == comp.mMonth) and (self.mDay == comp.mDay)
 
     def getPosixTime(self):
+        floating = self.floating()
+        if floating:
+            self.checkDefaultTimezone()
+
         # Look for cached value (or floating time which has to be calculated
-        # each time)
-        if (not self.mPosixTimeCached) or self.floating():
+        # each time, unless the default timezone is pinned)
+        if (not self.mPosixTimeCached) or (floating and not Timezone.sDefaultPinned):
             result = 0L
 
             # Add hour/mins/secs
@@ -290,8 +405,7 @@ class DateTime(ValueMixin):
             self.changed()
 
     def offsetDay(self, diff_day):
-        self.mDay += diff_day
-        self.normalise()
+        self.addSeconds(diff_day * 24 * 60 * 60)
 
     def setYearDay(self, day, allow_invalid=False):
         # 1 .. 366 offset from start, or
@@ -377,8 +491,7 @@ class DateTime(ValueMixin):
             return
 
         # What day does the current year start on, and diff that with the current day
-        temp = DateTime(year=self.mYear, month=1, day=1)
-        first_day = temp.getDayOfWeek()
+        first_day = utils.yearTable(self.mYear).mFirstDay
         current_day = self.getDayOfWeek()
 
         # Calculate and set yearday for start of week. The first week is the one that contains at least
@@ -401,32 +514,7 @@ class DateTime(ValueMixin):
         """
         Return the ISO week number for the current date.
         """
-
-        # What day does the current year start on
-        temp = DateTime(year=self.mYear, month=1, day=1)
-        first_day = temp.getDayOfWeek()
-        if first_day == 0:
-            first_day = 7
-        current_day = self.getDayOfWeek()
-        if current_day == 0:
-            current_day = 7
-
-        # This arithmetic uses the ISO day of week (1-7) and the year day to get the week number
-        week_no = (self.getYearDay() - current_day + 10) / 7
-
-        # Might need to adjust forward/backwards based on year boundaries
-        if week_no == 0:
-            # Last week of previous year
-            temp = DateTime(year=self.mYear - 1, month=12, day=31)
-            week_no = temp.getWeekNo()
-        elif week_no == 53:
-            # Might be first week of next year
-            temp = DateTime(year=self.mYear + 1, month=1, day=1)
-            first_day = temp.getDayOfWeek()
-            if first_day in (DateTime.MONDAY, DateTime.TUESDAY, DateTime.WEDNESDAY, DateTime.THURSDAY):
-                week_no = 1
-
-        return week_no
+        return utils.weekNumber(self.mYear, self.mMonth, self.mDay)
 
     def isWeekNo(self, weekno):
         # This is the iso 8601 week number definition
@@ -444,7 +532,8 @@ class DateTime(ValueMixin):
         self.mDay = 1
 
         # Determine first weekday in year
-        first_day = self.getDayOfWeek()
+        table = utils.yearTable(self.mYear)
+        first_day = table.mFirstDay
 
         if offset > 0:
             cycle = (offset - 1) * 7 + day
@@ -453,14 +542,14 @@ class DateTime(ValueMixin):
                 cycle += 7
             self.mDay = cycle + 1
         elif offset < 0:
-            first_day += 365 + [1, 0][not utils.isLeapYear(self.mYear)] - 1
+            first_day += table.mDaysInYear - 1
             first_day %= 7
 
             cycle = (-offset - 1) * 7 - day
             cycle += first_day
             if day > first_day:
                 cycle += 7
-            self.mDay = 365 + [1, 0][not utils.isLeapYear(self.mYear)] - cycle
+            self.mDay = table.mDaysInYear - cycle
 
         self.normalise()
 
@@ -525,13 +614,7 @@ class DateTime(ValueMixin):
         return self.compareDate(temp)
 
     def getDayOfWeek(self):
-        # Count days since 01-Jan-1970 which was a Thursday
-        result = DateTime.THURSDAY + self.daysSince1970()
-        result %= 7
-        if result < 0:
-            result += 7
-
-        return result
+        return utils.dayOfWeek(self.mYear, self.mMonth, self.mDay)
 
     def getMonthText(self, short_txt):
         # Make sure range is valid
@@ -562,8 +645,7 @@ class DateTime(ValueMixin):
             self.changed()
 
     def offsetHours(self, diff_hour):
-        self.mHours += diff_hour
-        self.normalise()
+        self.addSeconds(diff_hour * 60 * 60)
 
     def getMinutes(self):
         return self.mMinutes
@@ -574,8 +656,7 @@ class DateTime(ValueMixin):
             self.changed()
 
     def offsetMinutes(self, diff_minutes):
-        self.mMinutes += diff_minutes
-        self.normalise()
+        self.addSeconds(diff_minutes * 60)
 
     def getSeconds(self):
         return self.mSeconds
@@ -586,8 +667,37 @@ class DateTime(ValueMixin):
             self.changed()
 
     def offsetSeconds(self, diff_seconds):
-        self.mSeconds += diff_seconds
-        self.normalise()
+        self.addSeconds(diff_seconds)
+
+    def addSeconds(self, seconds, days=0):
+        """
+        Add an exact number of seconds to the local date and time, carrying whole days into the
+        date, and optionally a nominal number of days to the date. This gives the same result as
+        adding to the seconds and days and calling L{normalise} without having to normalise
+        each field in turn.
+
+        @param seconds: the number of seconds to add, which may be negative
+        @type seconds: L{int}
+        @param days: the number of days to add, which may be negative
+        @type days: L{int}
+        """
+        seconds += (self.mHours * 60 + self.mMinutes) * 60 + self.mSeconds
+        days += seconds // (24 * 60 * 60)
+        seconds %= 24 * 60 * 60
+        if self.mDateOnly:
+            self.mSeconds = self.mMinutes = self.mHours = 0
+        else:
+            self.mHours = seconds / (60 * 60)
+            self.mMinutes = (seconds / 60) % 60
+            self.mSeconds = seconds % 60
+
+        # Only need the full date normalisation if the day might not be in the month
+        day = self.mDay + days
+        if 0 < day <= 28 and 0 < self.mMonth <= 12:
+            self.mDay = day
+        else:
+            self.mYear, self.mMonth, self.mDay = utils.normaliseDate(self.mYear, self.mMonth, day)
+        self.changed()
 
     def getTimezoneUTC(self):
         return self.mTZUTC
@@ -839,18 +949,25 @@ class DateTime(ValueMixin):
 
     def getText(self):
 
+        # Calendars are generated far more often than they are changed, so the text is cached
+        # until the value is changed
+        if self.mText is not None:
+            return self.mText
+
         if self.mDateOnly:
-            return "%04d%02d%02d" % (self.mYear, self.mMonth, self.mDay)
+            text = "%04d%02d%02d" % (self.mYear, self.mMonth, self.mDay)
         else:
             if self.mTZUTC:
-                return "%04d%02d%02dT%02d%02d%02dZ" % (self.mYear, self.mMonth, self.mDay, self.mHours, self.mMinutes, self.mSeconds)
+                text = "%04d%02d%02dT%02d%02d%02dZ" % (self.mYear, self.mMonth, self.mDay, self.mHours, self.mMinutes, self.mSeconds)
             elif isinstance(self.mTZID, int):
                 sign = "-" if self.mTZID < 0 else "+"
                 hours = abs(self.mTZID) / 3600
                 minutes = divmod(abs(self.mTZID) / 60, 60)[1]
-                return "%04d%02d%02dT%02d%02d%02d%s%02d%02d" % (self.mYear, self.mMonth, self.mDay, self.mHours, self.mMinutes, self.mSeconds, sign, hours, minutes)
+                text = "%04d%02d%02dT%02d%02d%02d%s%02d%02d" % (self.mYear, self.mMonth, self.mDay, self.mHours, self.mMinutes, self.mSeconds, sign, hours, minutes)
             else:
-                return "%04d%02d%02dT%02d%02d%02d" % (self.mYear, self.mMonth, self.mDay, self.mHours, self.mMinutes, self.mSeconds)
+                text = "%04d%02d%02dT%02d%02d%02d" % (self.mYear, self.mMonth, self.mDay, self.mHours, self.mMinutes, self.mSeconds)
+        self.mText = text
+        return text
 
     def getXMLText(self):
 
@@ -956,6 +1073,54 @@ class DateTime(ValueMixin):
             raise ValueError("DateTime: invalid TZ offset length")
         return index
 
+    def parseFixed(self, data):
+        """
+        Parse the fixed width forms YYYYMMDD, YYYYMMDDTHHMMSS and YYYYMMDDTHHMMSSZ, which are
+        used by almost all iCalendar values, without the index stepping of L{parseGeneral}.
+
+        @param data: the text to parse
+        @type data: L{str}
+        @return: C{True} if the text was parsed, C{False} if it is not one of the fixed width forms
+        @rtype: L{bool}
+        """
+        # Looking up each pair of digits also checks that they are digits
+        digits = DateTime.cDigitPairs
+        dlen = len(data)
+        try:
+            if dlen == 8:
+                hours = None
+            elif (dlen == 15 or dlen == 16 and data[15] == "Z") and data[8] == "T":
+                hours = digits[data[9:11]]
+                minutes = digits[data[11:13]]
+                seconds = digits[data[13:15]]
+            else:
+                return False
+            year = digits[data[0:2]] * 100 + digits[data[2:4]]
+            month = digits[data[4:6]]
+            day = digits[data[6:8]]
+        except KeyError:
+            return False
+
+        self.mYear = year
+        self.mMonth = month
+        self.mDay = day
+        if hours is None:
+            self.mDateOnly = True
+        else:
+            self.mHours = hours
+            self.mMinutes = minutes
+            self.mSeconds = seconds
+            self.mDateOnly = False
+            self.mTZUTC = dlen == 16
+
+        # Always uncache posix time
+        self.changed()
+
+        # The fixed width forms are exactly what would be generated
+        if type(data) is str:
+            self.mText = data
+        return True
+
     def parse(self, data, fullISO=False):
 
         # iCalendar:
@@ -963,6 +1128,12 @@ class DateTime(ValueMixin):
         # vCard (fullISO), jCal
         #   parse format YYYY[-]MM[-]DD[THH[:]MM[:]SS[(Z/(+/-)HHMM]]
 
+        # Most values are in one of the fixed width forms which can be parsed directly
+        if not self.parseFixed(data):
+            self.parseGeneral(data, fullISO)
+
+    def parseGeneral(self, data, fullISO=False):
+
         try:
             # Parse out the date
             index = self.parseDate(data, fullISO)
@@ -1070,32 +1241,8 @@ class DateTime(ValueMixin):
         if self.mDateOnly:
             self.mSeconds = self.mMinutes = self.mHours = 0
 
-        # Adjust the month first, since the day adjustment is month dependent
-
-        # Normalise month
-        normalised_month = ((self.mMonth - 1) % 12) + 1
-        adjustment_year = (self.mMonth - 1) / 12
-        if (normalised_month - 1) < 0:
-            normalised_month += 12
-            adjustment_year -= 1
-        self.mMonth = normalised_month
-        self.mYear += adjustment_year
-
-        # Now do days
-        if self.mDay > 0:
-            while self.mDay > utils.daysInMonth(self.mMonth, self.mYear):
-                self.mDay -= utils.daysInMonth(self.mMonth, self.mYear)
-                self.mMonth += 1
-                if self.mMonth > 12:
-                    self.mMonth = 1
-                    self.mYear += 1
-        else:
-            while self.mDay <= 0:
-                self.mMonth -= 1
-                if self.mMonth < 1:
-                    self.mMonth = 12
-                    self.mYear -= 1
-                self.mDay += utils.daysInMonth(self.mMonth, self.mYear)
+        # Normalise month and day (the day adjustment is month dependent)
+        self.mYear, self.mMonth, self.mDay = utils.normaliseDate(self.mYear, self.mMonth, self.mDay)
 
         # Always invalidate posix time cache
         self.changed()
@@ -1103,9 +1250,18 @@ class DateTime(ValueMixin):
     def timeZoneSecondsOffset(self, relative_to_utc=False):
         if self.mTZUTC:
             return 0
+        if not self.mTZID:
+            self.checkDefaultTimezone()
         if self.mTZOffset is None:
-            tz = Timezone(utc=self.mTZUTC, tzid=self.mTZID)
-            self.mTZOffset = tz.timeZoneSecondsOffset(self, relative_to_utc)
+            tzid = self.mTZID
+            if tzid is None:
+                tzid = Timezone.sDefaultTimezone.getTimezoneID()
+            elif isinstance(tzid, int):
+                self.mTZOffset = tzid
+                return tzid
+
+            # Look up the offset directly from the integer key
+            self.mTZOffset = TimezoneDatabase.getTimezoneOffsetSecondsForKey(tzid, self.getOffsetKey(), self.mYear, relative_to_utc)
         return self.mTZOffset
 
     def timeZoneDescriptor(self):
@@ -1115,19 +1271,16 @@ class DateTime(ValueMixin):
     def changed(self):
         self.mPosixTimeCached = False
         self.mTZOffset = None
+        self.mLocalKey = None
+        self.mText = None
+
+    def checkDefaultTimezone(self):
+        # The cached offset and posix time of a floating value are only valid for the default
+        # timezone in use when they were determined
+        if self.mDefaultGeneration != Timezone.sDefaultGeneration:
+            self.mDefaultGeneration = Timezone.sDefaultGeneration
+            self.mPosixTimeCached = False
+            self.mTZOffset = None
 
     def daysSince1970(self):
-        # Add days between 1970 and current year (ignoring leap days)
-        result = (self.mYear - 1970) * 365
-
-        # Add leap days between years
-        result += utils.leapDaysSince1970(self.mYear - 1970)
-
-        # Add days in current year up to current month (includes leap day for
-        # current year as needed)
-        result += utils.daysUptoMonth(self.mMonth, self.mYear)
-
-        # Add days in month
-        result += self.mDay - 1
-
-        return result
+        return utils.daysSince1970(self.mYear, self.mMonth, self.mDay)
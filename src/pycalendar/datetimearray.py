@@ -0,0 +1,239 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Bulk conversion of lists of L{DateTime} values in a shared time zone to and from arrays of
+posix times (e.g. for handing instances to array based analysis code), and to and from
+standard library C{datetime} values.
+
+Rather than looking up the time zone offset of each value, the transitions of the time zone
+over the span of the values are found once and each value is matched against the interval it
+falls in, which for time ordered values (such as recurrence instances) only changes at a
+transition.
+"""
+
+from __future__ import absolute_import
+
+from array import array
+from bisect import bisect_right
+from pycalendar import utils
+from pycalendar.datetime import DateTime
+from pycalendar.timezone import Timezone
+from pycalendar.timezonedb import TimezoneDatabase
+import datetime
+
+# Posix times are stored as 64-bit integers where the platform's C long is 64 bits, otherwise
+# as doubles (which hold whole seconds exactly for any date)
+EPOCH_TYPECODE = "l" if array("l").itemsize >= 8 else "d"
+
+EPOCH_DATETIME = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = utils.dayOrdinal(1970, 1, 1)
+
+
+def toEpochs(values):
+    """
+    Posix times of a list of values, all in the same time zone. Each result is the same as
+    L{DateTime.getPosixTime} for the value.
+
+    @param values: the values to convert
+    @type values: L{list} of L{DateTime}
+    @return: the posix times
+    @rtype: L{array} of L{EPOCH_TYPECODE}
+    @raise ValueError: if the values are not all in the same time zone
+    """
+
+    results = array(EPOCH_TYPECODE)
+    if not values:
+        return results
+
+    tz = (values[0].getTimezoneUTC(), values[0].getTimezoneID(),)
+    for value in values:
+        if (value.getTimezoneUTC(), value.getTimezoneID(),) != tz:
+            raise ValueError("DateTime: values not in the same timezone: {}".format(value))
+
+    # Local seconds - with date-only values looked up at the end of their day, as for a
+    # date-only comparison any transition on the same day is before the value
+    local = []
+    lookup = []
+    for value in values:
+        seconds = localSeconds(value)
+        local.append(seconds)
+        lookup.append(seconds + 86399 if value.isDateOnly() else seconds)
+
+    offsets = OffsetIntervals(Timezone(utc=tz[0], tzid=tz[1]), min(lookup), max(lookup))
+    for seconds, key in zip(local, lookup):
+        results.append(seconds - offsets.offset(key))
+    return results
+
+
+def fromEpochs(epochs, tzid, date_only=False):
+    """
+    Values in a time zone for a list of posix times. This is the inverse of L{toEpochs} for
+    dates between 1901 and 2099 (outside of that L{DateTime.getPosixTime} does not use the
+    actual leap years).
+
+    @param epochs: the posix times to convert
+    @type epochs: iterable of L{int}
+    @param tzid: the time zone of the values to create, or C{None} for UTC
+    @type tzid: L{Timezone}
+    @param date_only: create date-only values for the date in the time zone
+    @type date_only: L{bool}
+    @return: the values
+    @rtype: L{list} of L{DateTime}
+    """
+
+    if tzid is None:
+        tzid = Timezone(utc=True)
+    epochs = [int(epoch) for epoch in epochs]
+    if not epochs:
+        return []
+
+    offsets = OffsetIntervals(tzid, min(epochs), max(epochs), relative_to_utc=True)
+    results = []
+    for epoch in epochs:
+        days, seconds = divmod(epoch + offsets.offset(epoch), 86400)
+        year, month, day = utils.ordinalDate(days + EPOCH_ORDINAL)
+        if date_only:
+            results.append(DateTime(year, month, day, tzid=tzid))
+        else:
+            results.append(DateTime(year, month, day, seconds / 3600, (seconds / 60) % 60, seconds % 60, tzid=tzid))
+    return results
+
+
+def toPyDateTimes(values):
+    """
+    Naive UTC standard library C{datetime} values for a list of values, all in the same time
+    zone.
+
+    @param values: the values to convert
+    @type values: L{list} of L{DateTime}
+    @rtype: L{list} of C{datetime.datetime}
+    """
+
+    return [EPOCH_DATETIME + datetime.timedelta(seconds=epoch) for epoch in toEpochs(values)]
+
+
+def fromPyDateTimes(values, tzid):
+    """
+    Values in a time zone for a list of standard library C{datetime} values. Naive values are
+    taken to be UTC.
+
+    @param values: the values to convert
+    @type values: L{list} of C{datetime.datetime}
+    @param tzid: the time zone of the values to create, or C{None} for UTC
+    @type tzid: L{Timezone}
+    @rtype: L{list} of L{DateTime}
+    """
+
+    epochs = []
+    for value in values:
+        offset = value.utcoffset()
+        if offset is not None:
+            value = value.replace(tzinfo=None) - offset
+        delta = value - EPOCH_DATETIME
+        epochs.append(delta.days * 86400 + delta.seconds)
+    return fromEpochs(epochs, tzid)
+
+
+def localSeconds(dt):
+    """
+    The local date and time of a value as seconds, on the same scale as
+    L{DateTime.getPosixTime}.
+    """
+    return utils.daysSince1970(dt.getYear(), dt.getMonth(), dt.getDay()) * 86400 + (dt.getHours() * 60 + dt.getMinutes()) * 60 + dt.getSeconds()
+
+
+class OffsetIntervals(object):
+    """
+    The UTC offsets of a time zone over a range of times, as intervals between transitions.
+    Looking up the offset for a time in the same interval as the previous lookup needs no
+    search.
+    """
+
+    def __init__(self, tzid, start, end, relative_to_utc=False):
+        """
+        @param tzid: the time zone
+        @type tzid: L{Timezone}
+        @param start: the earliest time to be looked up, in local or UTC seconds
+        @type start: L{int}
+        @param end: the latest time to be looked up, in local or UTC seconds
+        @type end: L{int}
+        @param relative_to_utc: if L{True} times are UTC, otherwise local
+        @type relative_to_utc: L{bool}
+        """
+
+        # Transition times and the offsets from them onwards
+        self.mKeys = []
+        self.mOffsets = []
+        self.mStart = start
+        self.mEnd = end
+
+        # The current interval
+        self.mLow = self.mHigh = self.mOffset = None
+
+        if tzid.getUTC():
+            self.mOffset = 0
+        elif isinstance(tzid.getTimezoneID(), int):
+            self.mOffset = tzid.getTimezoneID()
+        else:
+            # Floating values use the default timezone
+            if tzid.floating():
+                name = Timezone.sDefaultTimezone.getTimezoneID() if not Timezone.sDefaultTimezone.getUTC() else None
+            else:
+                name = tzid.getTimezoneID()
+            year = utils.ordinalDate(end / 86400 + EPOCH_ORDINAL)[0]
+
+            # Use the compiled table of the timezone if there is one
+            table = TimezoneDatabase.getTimezoneTable(name) if name is not None else None
+            if table is not None and table.covers(year):
+                for key, offset in zip(table.mUTCKeys if relative_to_utc else table.mLocalKeys, table.mOffsets):
+                    key = int(key)
+                    date = key / 86400
+                    self.mKeys.append(utils.daysSince1970(utils.unpackDateYear(date), utils.unpackDateMonth(date), utils.unpackDateDay(date)) * 86400 + key % 86400)
+                    self.mOffsets.append(offset)
+            else:
+                vtz = TimezoneDatabase.getTimezone(name) if name is not None else None
+                if vtz is None:
+                    self.mOffset = 0
+                else:
+                    # Expand up to the same point as a lookup of the latest time would
+                    for transition in vtz.expandAll(None, DateTime(year + 2, 1, 1, 0, 0, 0)):
+                        self.mKeys.append(transition[1].getPosixTime() if relative_to_utc else localSeconds(transition[0]))
+                        self.mOffsets.append(transition[3])
+
+        # A single interval covers all times
+        if self.mOffset is not None:
+            self.mLow = start
+            self.mHigh = end + 1
+
+    def offset(self, key):
+        """
+        The UTC offset at a time.
+
+        @param key: the time, in local or UTC seconds (as specified when created)
+        @type key: L{int}
+        @rtype: L{int}
+        """
+
+        if self.mLow is not None and self.mLow <= key < self.mHigh:
+            return self.mOffset
+
+        # Find the interval and remember it for the next lookup
+        i = bisect_right(self.mKeys, key)
+        self.mLow = self.mKeys[i - 1] if i != 0 else self.mStart
+        self.mHigh = self.mKeys[i] if i < len(self.mKeys) else self.mEnd + 1
+        self.mOffset = self.mOffsets[i - 1] if i != 0 else 0
+        return self.mOffset
@@ -31,6 +31,9 @@ class DateTimeValue(WrapperValue, Value):
     def parse(self, data, variant):
         self.mValue.parse(data, fullISO=(variant == "vcard"))
 
+    def getText(self):
+        return self.mValue.getText()
+
     def writeXML(self, node, namespace):
         self.mValue.writeXML(node, namespace)
 
@@ -64,6 +64,22 @@ class Duration(ValueMixin):
         return [1, -1][not self.mForward] \
             * (self.mSeconds + (self.mMinutes + (self.mHours + (self.mDays + (self.mWeeks * 7)) * 24) * 60) * 60)
 
+    def getNominalDays(self):
+        """
+        The number of days in the nominal (weeks and days) part of the duration, negative if the
+        duration is backwards. A nominal day is a calendar day, which is not always 24 hours.
+        """
+        days = self.mDays + self.mWeeks * 7
+        return days if self.mForward else -days
+
+    def getExactSeconds(self):
+        """
+        The number of seconds in the exact (hours, minutes and seconds) part of the duration,
+        negative if the duration is backwards.
+        """
+        seconds = self.mSeconds + (self.mMinutes + self.mHours * 60) * 60
+        return seconds if self.mForward else -seconds
+
     def setDuration(self, seconds):
         self.mForward = seconds >= 0
 
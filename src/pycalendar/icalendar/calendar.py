@@ -74,6 +74,7 @@ class Calendar(ContainerBase):
         self.mDescription = ""
         self.mMasterComponentsByTypeAndUID = collections.defaultdict(lambda: collections.defaultdict(list))
         self.mOverriddenComponentsByUID = collections.defaultdict(list)
+        self.mTimezonesByID = {}
 
     def __str__(self):
         """
@@ -307,7 +308,7 @@ class Calendar(ContainerBase):
 
     def addComponent(self, component):
         """
-        Override to track components by UID.
+        Override to track components by UID and timezones by TZID.
         """
         super(Calendar, self).addComponent(component)
 
@@ -318,10 +319,13 @@ class Calendar(ContainerBase):
                 self.mOverriddenComponentsByUID[uid].append(component)
             else:
                 self.mMasterComponentsByTypeAndUID[component.getType()][uid] = component
+        elif component.getType() == definitions.cICalComponent_VTIMEZONE:
+            # The first timezone with a TZID is the one used
+            self.mTimezonesByID.setdefault(component.getID(), []).append(component)
 
     def removeComponent(self, component):
         """
-        Override to track components by UID.
+        Override to track components by UID and timezones by TZID.
         """
         super(Calendar, self).removeComponent(component)
 
@@ -332,6 +336,48 @@ class Calendar(ContainerBase):
                 self.mOverriddenComponentsByUID[uid].remove(component)
             else:
                 del self.mMasterComponentsByTypeAndUID[component.getType()][uid]
+        elif component.getType() == definitions.cICalComponent_VTIMEZONE:
+            self._unmapTimezone(component, component.getID())
+
+    def removeAllComponent(self, compname=None):
+        """
+        Override to reset the maps when all components are removed.
+        """
+        super(Calendar, self).removeAllComponent(compname)
+
+        if not compname:
+            self.mMasterComponentsByTypeAndUID.clear()
+            self.mOverriddenComponentsByUID.clear()
+            self.mTimezonesByID.clear()
+
+    def changedTimezoneID(self, component, oldID):
+        """
+        Update the map of timezones by TZID when the TZID of one of them changes.
+
+        @param component: the timezone component whose TZID changed
+        @type component: L{VTimezone}
+        @param oldID: the previous TZID
+        @type oldID: C{str}
+        """
+        if self._unmapTimezone(component, oldID):
+            self.mTimezonesByID.setdefault(component.getID(), []).append(component)
+
+    def _unmapTimezone(self, component, tzid):
+        """
+        Remove a timezone component from the map of timezones by TZID.
+
+        @return: L{True} if it was in the map
+        @rtype: L{bool}
+        """
+        timezones = self.mTimezonesByID.get(tzid, ())
+        for ctr, timezone in enumerate(timezones):
+            if timezone is component:
+                del timezones[ctr]
+                if not timezones:
+                    del self.mTimezonesByID[tzid]
+                return True
+        else:
+            return False
 
     def deriveComponent(self, recurrenceID):
         """
@@ -610,11 +656,8 @@ class Calendar(ContainerBase):
 
     def getTimezone(self, tzid):
         # Find timezone that matches the name (which is the same as the map key)
-        for timezone in self.getComponents(definitions.cICalComponent_VTIMEZONE):
-            if timezone.getID() == tzid:
-                return timezone
-        else:
-            return None
+        timezones = self.mTimezonesByID.get(tzid)
+        return timezones[0] if timezones else None
 
     def addDefaultProperties(self):
         self.addProperty(Property(definitions.cICalProperty_PRODID, Calendar.sProdID))
@@ -685,8 +728,7 @@ class Calendar(ContainerBase):
         from pycalendar.timezonedb import TimezoneDatabase
         changed = False
         for component in self.getComponents(definitions.cICalComponent_VTIMEZONE):
-            tz = TimezoneDatabase.getTimezone(component.getID())
-            if tz is not None and TimezoneDatabase.isStandardTimezone(component.getID()):
+            if TimezoneDatabase.isStandardTimezone(component.getID()):
                 self.removeComponent(component)
                 changed = True
 
@@ -21,7 +21,6 @@ from pycalendar.icalendar.componentexpanded import ComponentExpanded
 from pycalendar.icalendar.property import Property
 from pycalendar.icalendar.recurrenceset import RecurrenceSet
 from pycalendar.timezone import Timezone
-from pycalendar.utils import set_difference
 import uuid
 
 
@@ -389,25 +388,79 @@ class ComponentRecur(Component):
                 self.mEnd.offsetDay(1)
                 self.mEnd.setHHMMSS(0, 0, 0)
 
-    def expandPeriod(self, period, results):
+    def expandPeriod(self, period, results, limit=None, after=None):
+        """
+        Add the instances of this component within the period to the results, in time order.
+
+        With a L{limit}, at most that many instances are added and the rules are only expanded
+        as far as needed. The returned cursor can be passed as L{after} to get the following
+        instances. Overridden instances are then included in place of the master instances they
+        override, paged by their RECURRENCE-ID along with the rest, so the overriding components
+        must not be expanded separately.
+
+        @param period: the period to expand over
+        @type period: L{Period}
+        @param results: list to add the L{ComponentExpanded} instances to
+        @type results: L{list}
+        @param limit: the maximum number of instances to add
+        @type limit: L{int}
+        @param after: only add instances after this one
+        @type after: L{DateTime}
+        @return: with a L{limit}, the cursor to resume from, or L{None} if there are no more
+            instances
+        @rtype: L{DateTime}
+        """
+
+        cursor = None
+
         # Check for recurrence and True master
         if ((self.mRecurrences is not None) and self.mRecurrences.hasRecurrence() and not self.isRecurrenceInstance()):
-            # Expand recurrences within the range
-            items = []
-            self.mRecurrences.expand(self.mStart, period, items)
-
             # Look for overridden recurrence items
             cal = self.mParentComponent
+            recurs = []
             if cal is not None:
-                # Remove recurrence instances from the list of items
-                recurs = []
                 cal.getRecurrenceInstancesIds(definitions.cICalComponent_VEVENT, self.getUID(), recurs)
-                recurs.sort()
-                if len(recurs) != 0:
-                    temp = []
-                    temp = set_difference(items, recurs)
-                    items = temp
+            overridden = set(recurs)
 
+            # Expand recurrences within the range, without the overridden ones. With a limit keep
+            # going until there are enough instances that are not overridden.
+            items = []
+            paged = {}
+            if limit is None:
+                self.mRecurrences.expand(self.mStart, period, items, after=after)
+                if overridden:
+                    items = [item for item in items if item not in overridden]
+            else:
+                more = True
+                last = after
+                while more and len(items) < limit:
+                    found = []
+                    more = self.mRecurrences.expand(self.mStart, period, found, limit=limit - len(items), after=last)
+                    items.extend([item for item in found if item not in overridden])
+                    if found:
+                        last = found[-1]
+
+                # Merge in the overriding components within the period that come after the cursor,
+                # in RECURRENCE-ID order, and cut the result back to the limit
+                if overridden:
+                    after_key = after.getPosixTime() if after is not None else None
+                    overrides = []
+                    cal.getRecurrenceInstancesItems(definitions.cICalComponent_VEVENT, self.getUID(), overrides)
+                    for override in overrides:
+                        rid = override.getRecurrenceID()
+                        if (after_key is None or rid.getPosixTime() > after_key) and override.withinPeriod(period):
+                            paged[rid] = override
+                    if paged:
+                        items = sorted(items + paged.keys(), key=lambda item: item.getPosixTime())
+                        if len(items) > limit:
+                            more = True
+                            del items[limit:]
+
+                if more:
+                    cursor = items[-1] if items else after
+
+            if cal is not None:
+                if len(recurs) != 0:
                     # Now get actual instances
                     instances = []
                     cal.getRecurrenceInstancesItems(definitions.cICalComponent_VEVENT, self.getUID(), instances)
@@ -425,7 +478,7 @@ class ComponentRecur(Component):
                     if len(prior) + len(future) == 0:
                         # Add each expanded item
                         for iter in items:
-                            results.append(self.createExpanded(self, iter))
+                            results.append(self.createExpanded(paged.get(iter, self), iter))
                     else:
                         # Sort each list first
                         prior.sort(self.sort_by_dtstart)
@@ -434,6 +487,11 @@ class ComponentRecur(Component):
                         # Add each expanded item
                         for iter1 in items:
 
+                            # Paged overridden instances come from their own component
+                            if iter1 in paged:
+                                results.append(self.createExpanded(paged[iter1], iter1))
+                                continue
+
                             # Now step through each using the slave item
                             # instead of the master as appropriate
                             slave = None
@@ -460,18 +518,20 @@ class ComponentRecur(Component):
                     for iter in items:
                         results.append(self.createExpanded(self, iter))
 
-        elif self.withinPeriod(period):
+        elif self.withinPeriod(period) and (after is None or self.mStart > after) and limit != 0:
             if self.isRecurrenceInstance():
                 rid = self.mRecurrenceID
             else:
                 rid = None
             results.append(ComponentExpanded(self, rid))
 
+        return cursor
+
     def withinPeriod(self, period):
-        # Check for recurrence
+        # Check for recurrence - only need to find the first instance
         if ((self.mRecurrences is not None) and self.mRecurrences.hasRecurrence()):
             items = []
-            self.mRecurrences.expand(self.mStart, period, items)
+            self.mRecurrences.expand(self.mStart, period, items, limit=1)
             return len(items) != 0
         else:
             # Does event span the period (assume self.mEnd > self.mStart)
@@ -14,10 +14,12 @@
 #    limitations under the License.
 ##
 
-from pycalendar import xmlutils
+from bisect import bisect_left, bisect_right
+from pycalendar import utils, xmlutils
 from pycalendar.datetime import DateTime
 from pycalendar.icalendar import definitions, xmldefinitions
 from pycalendar.icalendar.exceptions import TooManyInstancesError
+from pycalendar.icalendar.recurrencepacked import PackedSetGenerator, packDateTime, unpackDateTime
 from pycalendar.period import Period
 from pycalendar.valueutils import ValueMixin
 import cStringIO as StringIO
@@ -96,6 +98,40 @@ class Recurrence(ValueMixin):
 
     cUnknownIndex = -1
 
+    # Whether to generate the sets of instances for BYxxx rules using packed integers rather
+    # than DateTime objects where possible
+    cUsePackedSets = True
+
+    # Cached instances are looked up by posix time with this much slack (in seconds) either side
+    # of the requested range. This covers any difference between comparing the posix times and
+    # the date-only, floating or same time zone comparisons used to actually filter them.
+    cCacheLookupSlack = 2 * 24 * 60 * 60
+
+    # Process-wide memo of expansions shared by all rules, so that identical rules with identical
+    # DTSTARTs (e.g. copies of the same event in many calendars) are only expanded once for a
+    # given range. Set to L{None} to disable. The memo is bounded by the total number of instances
+    # it holds (each expansion counts as at least one), not by the number of expansions, and any
+    # single expansion of more than cExpansionMemoMaxInstances is not memoized at all, so that one
+    # long-running rule cannot flush everything else out.
+    cExpansionMemoSize = 100000
+    cExpansionMemoMaxInstances = 5000
+    sExpansionMemo = utils.LRUCache(cExpansionMemoSize)
+
+    @staticmethod
+    def getExpansionMemoStats():
+        """
+        The usage of the shared expansion memo.
+
+        @return: the hit and miss counts and number of entries
+        @rtype: L{dict}
+        """
+        return Recurrence.sExpansionMemo.getStats() if Recurrence.sExpansionMemo is not None else {}
+
+    @staticmethod
+    def clearExpansionMemo():
+        if Recurrence.sExpansionMemo is not None:
+            Recurrence.sExpansionMemo.clear()
+
     def __init__(self):
         self.init_Recurrence()
 
@@ -136,9 +172,14 @@ class Recurrence(ValueMixin):
             other.mCacheStart = self.mCacheStart.duplicate()
         if self.mCacheUpto:
             other.mCacheUpto = self.mCacheUpto.duplicate()
+        if self.mCacheFrom:
+            other.mCacheFrom = self.mCacheFrom.duplicate()
+        other.mCacheFloatOffset = self.mCacheFloatOffset
         other.mFullyCached = self.mFullyCached
         if self.mRecurrences:
             other.mRecurrences = self.mRecurrences[:]
+            other.mRecurrenceKeys = self.mRecurrenceKeys[:]
+            other.mRecurrencesSorted = self.mRecurrencesSorted
 
         return other
 
@@ -166,8 +207,13 @@ class Recurrence(ValueMixin):
         self.mCached = False
         self.mCacheStart = None
         self.mCacheUpto = None
+        self.mCacheFrom = None
+        self.mCacheFloatOffset = 0
+        self.mCacheExpansion = None
         self.mFullyCached = False
         self.mRecurrences = None
+        self.mRecurrenceKeys = []
+        self.mRecurrencesSorted = True
 
     def __hash__(self):
         return hash((
@@ -841,12 +887,51 @@ class Recurrence(ValueMixin):
         # we could end up looping forever when doing recurrence.
         start.normalise()
 
+        # Use the shared memo when this rule's own cache cannot supply the range. Results are
+        # copied in and out of the memo so that no instances are shared between rules.
+        if Recurrence.sExpansionMemo is not None and maxInstances is None and not self.isCached(start, range, float_offset):
+            key = (self.getText(),) + self.expansionKey(start) + (float_offset,) + self.expansionKey(range.getStart()) + self.expansionKey(range.getEnd())
+            result = Recurrence.sExpansionMemo.get(key)
+            if result is None:
+                instances = []
+                limited = self.expandCached(start, range, instances, float_offset)
+                if len(instances) <= Recurrence.cExpansionMemoMaxInstances:
+                    Recurrence.sExpansionMemo.put(key, (limited, [instance.duplicate() for instance in instances],), max(len(instances), 1))
+                items.extend(instances)
+            else:
+                limited, instances = result
+                items.extend([instance.duplicate() for instance in instances])
+            return limited
+
+        return self.expandCached(start, range, items, float_offset, maxInstances)
+
+    @staticmethod
+    def expansionKey(dt):
+        return (dt.getText(), dt.getTimezoneUTC(), dt.getTimezoneID(),)
+
+    def isCached(self, start, range, float_offset):
+        """
+        Determine whether the instance cache already covers the requested range.
+        """
+        return self.mCached and \
+            start == self.mCacheStart and \
+            float_offset == self.mCacheFloatOffset and \
+            (self.mCacheFrom is None or range.getStart() >= self.mCacheFrom) and \
+            (self.mFullyCached or self.mCacheUpto is not None and self.mCacheUpto >= range.getEnd())
+
+    def expandCached(self, start, range, items, float_offset=0, maxInstances=None):
+
         # Must have recurrence list at this point
         if self.mRecurrences is None:
             self.mRecurrences = []
 
-        # Wipe cache if start is different
-        if self.mCached and (start != self.mCacheStart):
+        # Wipe cache if start is different, or if the cached items were skipped ahead to a point
+        # after the start of the requested range
+        if self.mCached and (
+            start != self.mCacheStart or
+            float_offset != self.mCacheFloatOffset or
+            self.mCacheFrom is not None and range.getStart() < self.mCacheFrom
+        ):
             self.mCached = False
             self.mFullyCached = False
 
@@ -855,49 +940,184 @@ class Recurrence(ValueMixin):
         if not self.mCached or not self.mFullyCached \
                 and (self.mCacheUpto is None or self.mCacheUpto < range.getEnd()):
 
-            # Always wipe the existing cached items as we always start from the very first instance
-            # so we can properly track the count limit
-            self.mRecurrences = []
+            # Start again from the very first instance (so we can properly track the count limit)
+            # unless the expansion that produced the existing cached items can be resumed
+            if not self.mCached or self.mCacheExpansion is None:
+                self.mRecurrences = []
+                self.mRecurrenceKeys = []
+                self.mRecurrencesSorted = True
 
-            # Simple expansion is one where there is no BYXXX rule part
-            if not self.hasBy():
-                self.mFullyCached = self.simpleExpand(start, range, self.mRecurrences, float_offset, maxInstances=maxInstances)
-            else:
-                self.mFullyCached = self.complexExpand(start, range, self.mRecurrences, float_offset, maxInstances=maxInstances)
+                # Rules without a COUNT may skip ahead to the requested range
+                self.mCacheExpansion = RecurrenceExpansion(self, start, float_offset, skipto=range.getStart())
+
+            # Generate instances up to the end of the range - with a resumed expansion only the
+            # ones after the previous range end are added
+            expansion = self.mCacheExpansion
+            self.mFullyCached = self.expandInstances(expansion, range.getEnd(), self.mRecurrences, maxInstances)
+            self.mCacheExpansion = expansion if not self.mFullyCached else None
+            self.mCacheFrom = expansion.mSkipTo if expansion.mSkipped else None
+            self.addRecurrenceKeys()
 
             # Set cache values
             self.mCached = True
             self.mCacheStart = start
+            self.mCacheFloatOffset = float_offset
             self.mCacheUpto = range.getEnd()
 
-        # Just return the cached items in the requested range
-        limited = not self.mFullyCached
-        for iter in self.mRecurrences:
+        # Just return the cached items in the requested range - if instances were skipped
+        # then some exist before the range
+        limited = not self.mFullyCached or self.mCacheFrom is not None
+
+        # When the cached items are in time order only those close to the range need to be checked
+        if self.mRecurrencesSorted:
+            lower = bisect_left(self.mRecurrenceKeys, range.getStart().getPosixTime() - Recurrence.cCacheLookupSlack)
+            upper = bisect_right(self.mRecurrenceKeys, range.getEnd().getPosixTime() + Recurrence.cCacheLookupSlack)
+            if lower != 0 or upper != len(self.mRecurrences):
+                limited = True
+            candidates = self.mRecurrences[lower:upper]
+        else:
+            candidates = self.mRecurrences
+
+        for iter in candidates:
             if range.isDateWithinPeriod(iter):
                 items.append(iter)
             else:
                 limited = True
         return limited
 
+    def addRecurrenceKeys(self):
+        """
+        Add the posix time keys for any newly cached instances, noting whether the cached
+        instances are still in time order.
+        """
+        keys = self.mRecurrenceKeys
+        for iter in self.mRecurrences[len(keys):]:
+            key = iter.getPosixTime()
+            if keys and key < keys[-1]:
+                self.mRecurrencesSorted = False
+            keys.append(key)
+
+    def iterInstances(self, start, range, float_offset=0):
+        """
+        Lazily generate the instances of this rule that fall within the specified period, in
+        time order. Instances are only computed as the consumer asks for them, so a caller that
+        only needs the first few instances in a range can stop early without the rest of the
+        range (or the rule) being expanded. Note that the rule's instance cache is not used
+        or updated.
+
+        @param start: the DTSTART of the component the rule applies to
+        @type start: L{DateTime}
+        @param range: the period to generate instances for
+        @type range: L{Period}
+        @param float_offset: offset to apply to UNTIL when DTSTART is floating
+        @type float_offset: L{int}
+        """
+
+        # Have to normalize this to be very sure we are starting with a valid date, as otherwise
+        # we could end up looping forever when doing recurrence.
+        start.normalise()
+
+        expansion = RecurrenceExpansion(self, start, float_offset, skipto=range.getStart())
+        for iter in expansion.iterUpto(range.getEnd()):
+            if not range.isDateBeforePeriod(iter):
+                yield iter
+
     def simpleExpand(self, start, range, items, float_offset, maxInstances=None):
+        expansion = RecurrenceExpansion(self, start, float_offset, simple=True)
+        return self.expandInstances(expansion, range.getEnd(), items, maxInstances)
+
+    def complexExpand(self, start, range, items, float_offset, maxInstances=None):
+        expansion = RecurrenceExpansion(self, start, float_offset, simple=False)
+        return self.expandInstances(expansion, range.getEnd(), items, maxInstances)
+
+    def expandInstances(self, expansion, upto, items, maxInstances=None):
+        """
+        Add the instances of an expansion up to the specified horizon to a list.
+
+        @return: L{True} if the rule has no more instances, L{False} otherwise
+        @rtype: L{bool}
+        """
+        for iter in expansion.iterUpto(upto):
+            items.append(iter)
+            if maxInstances and len(items) > maxInstances:
+                raise TooManyInstancesError("Too many instances")
+        return expansion.mComplete
+
+    def skipIntervals(self, start, target):
+        """
+        Determine how many whole intervals of a rule can be skipped from DTSTART without passing
+        any instance at or after the target. The calculation is done on the date-time fields and
+        is deliberately conservative (it backs off by a couple of days, or a month for MONTHLY and
+        YEARLY rules) so that time zone offsets and date-only comparisons between the target and
+        the instances do not need to be taken into account. For a rule with BYxxx parts the
+        instances generated for each interval are all within that interval (or a few days either
+        side of it for weeks that span years), so this also covers the sets of instances.
+
+        @param start: the DTSTART of the component the rule applies to
+        @type start: L{DateTime}
+        @param target: the date-time at which instances are first needed
+        @type target: L{DateTime}
+        @return: number of intervals to skip
+        @rtype: L{int}
+        """
+        if self.mFreq == definitions.eRecurrence_YEARLY:
+            units = target.getYear() - start.getYear() - 1
+        elif self.mFreq == definitions.eRecurrence_MONTHLY:
+            units = (target.getYear() - start.getYear()) * 12 + target.getMonth() - start.getMonth() - 1
+        else:
+            # Sub-daily rules do not make sense for a date-only start
+            if start.isDateOnly() and self.mFreq not in (definitions.eRecurrence_DAILY, definitions.eRecurrence_WEEKLY):
+                return 0
+            units = target.daysSince1970() - start.daysSince1970() - 2
+            if self.mFreq == definitions.eRecurrence_WEEKLY:
+                units /= 7
+            elif self.mFreq != definitions.eRecurrence_DAILY:
+                units = units * 24 + target.getHours() - start.getHours()
+                if self.mFreq != definitions.eRecurrence_HOURLY:
+                    units = units * 60 + target.getMinutes() - start.getMinutes()
+                    if self.mFreq != definitions.eRecurrence_MINUTELY:
+                        units = units * 60 + target.getSeconds() - start.getSeconds()
+
+        return units / self.mInterval if units > 0 else 0
+
+    def simpleIterate(self, start, float_offset, expansion):
+        """
+        Generator for the instances of a rule with no BYxxx parts. A L{None} value is generated
+        whenever the next instance would be on or after the L{RecurrenceExpansion} horizon, and
+        generation resumes from that point once the horizon has been moved past it.
+        """
         start_iter = start.duplicate()
         ctr = 0
 
         if self.mUseUntil:
-            float_until = self.mUntil.duplicate()
             if start.floating():
+                float_until = self.mUntil.duplicate()
                 float_until.setTimezoneID(0)
                 float_until.offsetSeconds(float_offset)
+            else:
+                # Only compared with so can be shared
+                float_until = self.mUntil
+
+        # Without a COUNT there is no need to visit each instance before the point the
+        # expansion is needed from, so jump straight to it
+        if expansion.mSkipTo is not None and not self.mUseCount:
+            skip = self.skipIntervals(start, expansion.mSkipTo)
+            if skip:
+                expansion.mSkipped = True
+                start_iter.recur(self.mFreq, self.mInterval * skip, allow_invalid=True)
+                while start_iter.invalid():
+                    start_iter.recur(self.mFreq, self.mInterval, allow_invalid=True)
+                if self.mUseUntil and start_iter > float_until:
+                    expansion.mComplete = True
+                    return
 
         while True:
-            # Exit if after period we want
-            if range.isDateAfterPeriod(start_iter):
-                return False
+            # Pause if after period we want
+            while start_iter >= expansion.mUpto:
+                yield None
 
             # Add current one to list
-            items.append(start_iter.duplicate())
-            if maxInstances and len(items) > maxInstances:
-                raise TooManyInstancesError("Too many instances")
+            yield start_iter.duplicate()
 
             # Get next item
             start_iter.recur(self.mFreq, self.mInterval, allow_invalid=True)
@@ -909,36 +1129,70 @@ class Recurrence(ValueMixin):
                 # Bump counter and exit if over
                 ctr += 1
                 if ctr >= self.mCount:
-                    return True
+                    expansion.mComplete = True
+                    return
             elif self.mUseUntil:
                 # Exit if next item is after until (its OK if its the same as
                 # UNTIL as UNTIL is inclusive)
                 if start_iter > float_until:
-                    return True
+                    expansion.mComplete = True
+                    return
 
-    def complexExpand(self, start, range, items, float_offset, maxInstances=None):
+    def complexIterate(self, start, float_offset, expansion):
+        """
+        Generator for the instances of a rule with BYxxx parts. A L{None} value is generated
+        whenever the next instance, or the start of the next set, would be on or after the
+        L{RecurrenceExpansion} horizon, and generation resumes from that point once the horizon
+        has been moved past it.
+        """
         start_iter = start.duplicate()
         ctr = 0
 
         if self.mUseUntil:
-            float_until = self.mUntil.duplicate()
             if start.floating():
+                float_until = self.mUntil.duplicate()
                 float_until.setTimezoneID(None)
                 float_until.offsetSeconds(float_offset)
+            else:
+                # Only compared with so can be shared
+                float_until = self.mUntil
 
         # Always add the initial instance DTSTART
         if self.mUseCount:
             # Bump counter and exit if over
             ctr += 1
             if ctr >= self.mCount:
-                return True
+                expansion.mComplete = True
+                return
+
+        # Use packed integer sets if possible
+        packed = None
+        if Recurrence.cUsePackedSets and PackedSetGenerator.supports(self, start):
+            packed = PackedSetGenerator(self)
+            start_key = packDateTime(start)
+
+        # Without a COUNT there is no need to generate the sets before the point the expansion
+        # is needed from, so jump straight to it
+        if expansion.mSkipTo is not None and not self.mUseCount:
+            skip = self.skipIntervals(start, expansion.mSkipTo)
+            if skip:
+                expansion.mSkipped = True
+                start_iter.recur(self.mFreq, self.mInterval * skip, allow_invalid=True)
 
         # Need to re-initialise start based on BYxxx rules
         while True:
             # Behaviour is based on frequency
             set_items = []
 
-            if self.mFreq == definitions.eRecurrence_SECONDLY:
+            if packed is not None:
+                # Only need DateTime objects for the ones not before the start
+                set_items = [
+                    unpackDateTime(key, start_iter)
+                    for key in packed.generateSet(start_iter)
+                    if key >= start_key
+                ]
+
+            elif self.mFreq == definitions.eRecurrence_SECONDLY:
                 self.generateSecondlySet(start_iter, set_items)
 
             elif self.mFreq == definitions.eRecurrence_MINUTELY:
@@ -959,9 +1213,10 @@ class Recurrence(ValueMixin):
             elif self.mFreq == definitions.eRecurrence_YEARLY:
                 self.generateYearlySet(start_iter, set_items)
 
-            # Always sort the set as BYxxx rules may not be sorted
+            # Always sort the set as BYxxx rules may not be sorted (packed sets already are)
             # set_items.sort(cmp=DateTime.sort)
-            set_items.sort(key=lambda x: x.getPosixTime())
+            if packed is None:
+                set_items.sort(key=lambda x: x.getPosixTime())
 
             # Process each one in the generated set
             for iter in set_items:
@@ -974,36 +1229,36 @@ class Recurrence(ValueMixin):
                 if iter < start:
                     continue
 
-                # Exit if after period we want
-                if range.isDateAfterPeriod(iter):
-                    return False
+                # Pause if after period we want
+                while iter >= expansion.mUpto:
+                    yield None
 
                 # Exit if beyond the UNTIL limit
                 if self.mUseUntil:
                     # Exit if next item is after until (its OK if its the same
                     # as UNTIL as UNTIL is inclusive)
                     if iter > float_until:
-                        return True
+                        expansion.mComplete = True
+                        return
 
                 # Special for start instance
                 if (ctr == 1) and (start == iter):
                     continue
 
                 # Add current one to list
-                items.append(iter)
-                if maxInstances and len(items) > maxInstances:
-                    raise TooManyInstancesError("Too many instances")
+                yield iter
 
                 # Check limits
                 if self.mUseCount:
                     # Bump counter and exit if over
                     ctr += 1
                     if ctr >= self.mCount:
-                        return True
+                        expansion.mComplete = True
+                        return
 
-            # Exit if after period we want
-            if range.isDateAfterPeriod(start_iter):
-                return False
+            # Pause if after period we want
+            while start_iter >= expansion.mUpto:
+                yield None
 
             # Get next item
             start_iter.recur(self.mFreq, self.mInterval, allow_invalid=True)
@@ -1011,8 +1266,11 @@ class Recurrence(ValueMixin):
     def clear(self):
         self.mCached = False
         self.mFullyCached = False
+        self.mCacheExpansion = None
         if self.mRecurrences is not None:
             self.mRecurrences = []
+        self.mRecurrenceKeys = []
+        self.mRecurrencesSorted = True
 
     # IMPORTANT ExcludeFutureRecurrence assumes mCacheStart is setup with the
     # owning VEVENT's DTSTART
@@ -1668,3 +1926,44 @@ class Recurrence(ValueMixin):
                     output.append(dates[input_size + iter])
 
         return output
+
+
+class RecurrenceExpansion(object):
+    """
+    The state of a lazy, in-order expansion of a L{Recurrence} from a specific DTSTART. Instances
+    are generated up to (but not including) a horizon date-time. The horizon can be moved
+    forward and generation will resume from where it stopped, so earlier instances never have
+    to be re-generated. L{mComplete} is set once the rule's COUNT or UNTIL limit is reached.
+
+    If a skip-to date-time is given, instances of rules without a COUNT that are before it may
+    be skipped entirely (though some instances before it can still be generated).
+    L{mSkipped} is set if that happens.
+    """
+
+    def __init__(self, rule, start, float_offset=0, simple=None, skipto=None):
+        if simple is None:
+            simple = not rule.hasBy()
+        start = start.duplicate()
+        self.mUpto = None
+        self.mSkipTo = skipto
+        self.mSkipped = False
+        self.mComplete = False
+        if simple:
+            self.mInstances = rule.simpleIterate(start, float_offset, self)
+        else:
+            self.mInstances = rule.complexIterate(start, float_offset, self)
+
+    def iterUpto(self, upto):
+        """
+        Generate the next instances before the specified horizon.
+
+        @param upto: the horizon (exclusive) to generate instances up to
+        @type upto: L{DateTime}
+        """
+        self.mUpto = upto
+        if self.mComplete:
+            return
+        for iter in self.mInstances:
+            if iter is None:
+                return
+            yield iter
@@ -0,0 +1,283 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Expansion of many recurrence rules over the same period in one go (e.g. when determining
+free-busy for a large number of recurring events).
+
+The days around the period are tabulated once as packed integers (see L{recurrencepacked}) and
+the instances of each of the common simple rules (DAILY, WEEKLY and MONTHLY with at most
+BYDAY and BYMONTHDAY) are picked out of that table with index arithmetic, so L{DateTime} objects
+are only created for actual instances. Other rules fall back to L{Recurrence.expand}. Identical
+rules with identical DTSTARTs are only expanded once.
+"""
+
+from pycalendar import utils
+from pycalendar.icalendar import definitions
+from pycalendar.icalendar.recurrencepacked import packInstance, packDateTime, \
+    unpackDateTime
+from pycalendar.utils import dayOrdinal, normaliseDate
+
+
+def expandSeries(series, range, float_offset=0):
+    """
+    Expand each of a set of recurrence rules over the same period.
+
+    @param series: the DTSTART and rule of each recurring item
+    @type series: iterable of (L{DateTime}, L{Recurrence})
+    @param range: the period to expand over
+    @type range: L{Period}
+    @param float_offset: offset to apply to UNTIL when DTSTART is floating
+    @type float_offset: L{int}
+    @return: the instances within the period for each item, in the same order as L{series}
+    @rtype: L{list} of L{list} of L{DateTime}
+    """
+
+    window = None
+    expanded = {}
+    results = []
+    for start, rule in series:
+        start.normalise()
+
+        # Re-use the results for a rule and start we have already seen
+        key = (rule.getText(), start.getText(), start.getTimezoneUTC(), start.getTimezoneID(),)
+        if key in expanded:
+            results.append([instance.duplicate() for instance in expanded[key]])
+            continue
+
+        instances = None
+        if SeriesWindow.supports(start, rule):
+            if window is None:
+                window = SeriesWindow(range)
+            instances = window.expand(start, rule, float_offset)
+        if instances is None:
+            instances = []
+            rule.expand(start, range, instances, float_offset)
+
+        expanded[key] = instances
+        results.append(instances)
+
+    return results
+
+
+class SeriesWindow(object):
+    """
+    A table of the local days covering a period (with enough slack either side to allow for any
+    time zone offset), used to expand simple rules without stepping through their instances.
+    """
+
+    # Days before the period start and after the period end included in the table. As well as
+    # allowing for time zone offsets, this covers the days of a WEEKLY set in the period whose
+    # own day is outside of it.
+    cSlackBefore = 9
+    cSlackAfter = 9
+
+    @staticmethod
+    def supports(start, rule):
+        """
+        Determine whether the rule can be expanded from the table.
+
+        @param start: the DTSTART of the component the rule applies to
+        @type start: L{DateTime}
+        @param rule: the rule to expand
+        @type rule: L{Recurrence}
+        """
+
+        freq = rule.getFreq()
+        if freq not in (definitions.eRecurrence_DAILY, definitions.eRecurrence_WEEKLY, definitions.eRecurrence_MONTHLY):
+            return False
+
+        # Only BYDAY (without a numeric offset) and BYMONTHDAY (not for WEEKLY)
+        for by in (rule.mBySeconds, rule.mByMinutes, rule.mByHours, rule.mByYearDay, rule.mByWeekNo, rule.mByMonth, rule.mBySetPos):
+            if by:
+                return False
+        if rule.mByDay and any([offset != 0 for offset, _ignore_weekday in rule.mByDay]):
+            return False
+        if rule.mByMonthDay and freq == definitions.eRecurrence_WEEKLY:
+            return False
+
+        # COUNT requires every instance to be counted from the start, except for DAILY and WEEKLY
+        # without BYxxx where the last instance can be calculated directly
+        if rule.getUseCount() and (rule.hasBy() or freq == definitions.eRecurrence_MONTHLY):
+            return False
+
+        return True
+
+    def __init__(self, range):
+        self.mRange = range
+
+        first = range.getStart()
+        last = range.getEnd()
+        last_day = packInstance(*normaliseDate(last.getYear(), last.getMonth(), last.getDay() + SeriesWindow.cSlackAfter) + (0,))
+
+        # Tabulate each day
+        self.mDays = []
+        self.mWeekdays = []
+        self.mMonths = []
+        self.mMonthDays = []
+        self.mMonthDaysFromEnd = []
+        year, month, day = normaliseDate(first.getYear(), first.getMonth(), first.getDay() - SeriesWindow.cSlackBefore)
+        self.mFirstOrdinal = dayOrdinal(year, month, day)
+        while True:
+            key = packInstance(year, month, day, 0)
+            if key > last_day:
+                break
+            table = utils.yearTable(year)
+            days_in_month = table.mDaysInMonth[month]
+            self.mDays.append(key)
+            self.mWeekdays.append(utils.dayOfWeek(year, month, day))
+            self.mMonths.append(year * 12 + month - 1)
+            self.mMonthDays.append(day)
+            self.mMonthDaysFromEnd.append(day - 1 - days_in_month)
+
+            day += 1
+            if day > days_in_month:
+                day = 1
+                month += 1
+                if month > 12:
+                    month = 1
+                    year += 1
+
+    def expand(self, start, rule, float_offset):
+        """
+        Expand a rule using the table.
+
+        @param start: the DTSTART of the component the rule applies to
+        @type start: L{DateTime}
+        @param rule: the rule to expand
+        @type rule: L{Recurrence}
+        @param float_offset: offset to apply to UNTIL when DTSTART is floating
+        @type float_offset: L{int}
+        @return: the instances within the period
+        @rtype: L{list} of L{DateTime}
+        """
+
+        if rule.getFreq() == definitions.eRecurrence_MONTHLY:
+            indexes = self.monthlyIndexes(start, rule)
+        else:
+            indexes = self.dailyIndexes(start, rule)
+
+        # Nothing before the start
+        start_index = dayOrdinal(start.getYear(), start.getMonth(), start.getDay()) - self.mFirstOrdinal
+
+        # The last instance of a simple DAILY or WEEKLY rule with COUNT is a fixed number of days
+        # after the start
+        last_index = None
+        if rule.getUseCount():
+            step = rule.getInterval() * (1 if rule.getFreq() == definitions.eRecurrence_DAILY else 7)
+            last_index = start_index + step * (rule.getCount() - 1)
+
+        float_until = None
+        if rule.getUseUntil():
+            float_until = rule.getUntil().duplicate()
+            if start.floating():
+                float_until.setTimezoneID(None)
+                float_until.offsetSeconds(float_offset)
+
+        start_key = packDateTime(start)
+        time_of_day = start_key % 86400
+        simple = not rule.hasBy()
+        items = []
+        for index in indexes:
+            if index < start_index:
+                continue
+            if last_index is not None and index > last_index:
+                break
+            instance = unpackDateTime(self.mDays[index] + time_of_day, start)
+
+            # A simple rule always includes DTSTART irrespective of UNTIL
+            if float_until is not None and instance > float_until and not (simple and index == start_index):
+                break
+            if self.mRange.isDateWithinPeriod(instance):
+                items.append(instance)
+
+        return items
+
+    def dailyIndexes(self, start, rule):
+        """
+        Table indexes of the candidate days for a DAILY or WEEKLY rule, in order.
+        """
+
+        daily = rule.getFreq() == definitions.eRecurrence_DAILY
+        step = rule.getInterval() * (1 if daily else 7)
+
+        # Sets are a fixed number of days apart so the first one in the table is found directly
+        index = dayOrdinal(start.getYear(), start.getMonth(), start.getDay()) - self.mFirstOrdinal
+        if index < 0:
+            index %= step
+
+        # Each set of a WEEKLY rule with BYDAY starts on the week start day on or before the
+        # day of the set, with instances at fixed offsets from that
+        weekstart = None
+        offsets = [0]
+        if not daily and rule.getByDay():
+            weekstart = rule.mWeekstart
+            offsets = sorted([(weekday - weekstart) % 7 for _ignore_offset, weekday in rule.getByDay()])
+
+        # BYDAY and BYMONTHDAY limit DAILY rules
+        weekdays = set([weekday for _ignore_offset, weekday in rule.getByDay()]) if daily and rule.getByDay() else None
+        monthdays = rule.getByMonthDay() or None
+
+        indexes = []
+        table_size = len(self.mDays)
+        while index < table_size:
+            set_index = index
+            if weekstart is not None:
+                set_index -= (self.mWeekdays[index] - weekstart) % 7
+            for offset in offsets:
+                day_index = set_index + offset
+                if day_index < 0:
+                    continue
+                if day_index >= table_size:
+                    break
+                if weekdays is not None and self.mWeekdays[day_index] not in weekdays:
+                    continue
+                if monthdays is not None and self.mMonthDays[day_index] not in monthdays and self.mMonthDaysFromEnd[day_index] not in monthdays:
+                    continue
+                indexes.append(day_index)
+            index += step
+
+        return indexes
+
+    def monthlyIndexes(self, start, rule):
+        """
+        Table indexes of the candidate days for a MONTHLY rule, in order.
+        """
+
+        start_month = start.getYear() * 12 + start.getMonth() - 1
+        interval = rule.getInterval()
+        weekdays = [weekday for _ignore_offset, weekday in rule.getByDay()] if rule.getByDay() else None
+        monthdays = rule.getByMonthDay() or None
+
+        indexes = []
+        for index, month in enumerate(self.mMonths):
+            if month < start_month or (month - start_month) % interval != 0:
+                continue
+
+            # BYMONTHDAY and BYDAY expand the month - with BYMONTHDAY and BYDAY together, BYDAY
+            # limits the BYMONTHDAY days. Without either, the DTSTART day is used if valid for
+            # the month. Repeated values give repeated instances.
+            if monthdays is not None:
+                count = monthdays.count(self.mMonthDays[index]) + monthdays.count(self.mMonthDaysFromEnd[index])
+                if count and weekdays is not None and self.mWeekdays[index] not in weekdays:
+                    count = 0
+            elif weekdays is not None:
+                count = weekdays.count(self.mWeekdays[index])
+            else:
+                count = 1 if self.mMonthDays[index] == start.getDay() else 0
+            indexes.extend([index] * count)
+
+        return indexes
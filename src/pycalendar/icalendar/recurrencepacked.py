@@ -0,0 +1,519 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Generation of the sets of instances for recurrence rules with BYxxx parts using packed integers
+rather than L{DateTime} objects for the candidate instances.
+
+Each candidate is a single integer combining the year, month, day and seconds-of-day fields of a
+local date-time, so ordering the integers orders the date-times. As with L{utils.packDate}, the
+day field is offset so that it can be out of range for the month - the BYxxx expansion steps
+produce intermediate "invalid" days (e.g. February 30th, or January 100th from BYYEARDAY) in
+exactly the same way as the equivalent L{DateTime} methods do, and those are only normalised or
+removed at the same points. The day field is wider than that of L{utils.packDate} as such
+intermediate days can be in the range -512 to 511.
+"""
+
+from pycalendar import utils
+from pycalendar.utils import normaliseDate
+from pycalendar.icalendar import definitions
+
+
+def packInstance(year, month, day, seconds):
+    return ((((year << 4) | month) << 10) | (day + 512)) * 86400 + seconds
+
+
+def unpackInstance(key):
+    date, seconds = divmod(key, 86400)
+    return date >> 14, (date >> 10) & 0xF, (date & 0x3FF) - 512, seconds
+
+
+def packDateTime(dt):
+    """
+    Pack the local date-time fields of a L{DateTime}.
+    """
+    return packInstance(
+        dt.getYear(),
+        dt.getMonth(),
+        dt.getDay(),
+        (dt.getHours() * 60 + dt.getMinutes()) * 60 + dt.getSeconds(),
+    )
+
+
+def unpackDateTime(key, template):
+    """
+    Create a L{DateTime} from packed date-time fields, with the time zone and date-only state
+    of another L{DateTime}.
+    """
+    year, month, day, seconds = unpackInstance(key)
+    dt = template.duplicate()
+    dt.setYYMMDD(year, month, day)
+    dt.setHHMMSS(seconds / 3600, (seconds / 60) % 60, seconds % 60)
+    return dt
+
+
+def setYearDay(year, month, day, yearday, allow_invalid=False):
+    """
+    Equivalent of L{DateTime.setYearDay}.
+    """
+    if yearday == 366:
+        month = 12
+        day = 31 if utils.isLeapYear(year) else 32
+    elif yearday == -366:
+        month = 1
+        day = 1 if utils.isLeapYear(year) else 0
+    elif yearday > 0:
+        month = 1
+        day = yearday
+    elif yearday < 0:
+        month = 12
+        day = 31 + yearday + 1
+
+    if not allow_invalid:
+        return normaliseDate(year, month, day)
+    else:
+        return year, month, day
+
+
+def setWeekNo(year, month, day, weekno):
+    """
+    Equivalent of L{DateTime.setWeekNo}.
+    """
+
+    # Don't both if already correct
+    if utils.weekNumber(year, month, day) == weekno:
+        return year, month, day
+
+    first_day = utils.yearTable(year).mFirstDay
+    current_day = utils.dayOfWeek(year, month, day)
+    if first_day in (1, 2, 3, 4):
+        year_day = (weekno - 1) * 7 + current_day - first_day
+    else:
+        year_day = weekno * 7 + current_day - first_day
+
+    if year_day < 0:
+        year, month, day = normaliseDate(year - 1, month, day)
+    else:
+        year_day += 1
+    return setYearDay(year, month, day, year_day)
+
+
+def setDayOfWeekInYear(year, offset, weekday):
+    """
+    Equivalent of L{DateTime.setDayOfWeekInYear}.
+    """
+    day = 1
+    table = utils.yearTable(year)
+    first_day = table.mFirstDay
+
+    if offset > 0:
+        cycle = (offset - 1) * 7 + weekday - first_day
+        if first_day > weekday:
+            cycle += 7
+        day = cycle + 1
+    elif offset < 0:
+        first_day = (first_day + table.mDaysInYear - 1) % 7
+
+        cycle = (-offset - 1) * 7 - weekday + first_day
+        if weekday > first_day:
+            cycle += 7
+        day = table.mDaysInYear - cycle
+
+    return normaliseDate(year, 1, day)
+
+
+def setDayOfWeekInMonth(year, month, offset, weekday, allow_invalid=False):
+    """
+    Equivalent of L{DateTime.setDayOfWeekInMonth}.
+    """
+    day = 1
+    first_day = utils.dayOfWeek(year, month, 1)
+
+    if offset > 0:
+        cycle = (offset - 1) * 7 + weekday - first_day
+        if first_day > weekday:
+            cycle += 7
+        day = cycle + 1
+    elif offset < 0:
+        days_in_month = utils.daysInMonth(month, year)
+        first_day = (first_day + days_in_month - 1) % 7
+
+        cycle = (-offset - 1) * 7 - weekday + first_day
+        if weekday > first_day:
+            cycle += 7
+        day = days_in_month - cycle
+
+    if not allow_invalid:
+        return normaliseDate(year, month, day)
+    else:
+        return year, month, day
+
+
+class PackedSetGenerator(object):
+    """
+    Generates the set of instances for each FREQ interval of a L{Recurrence} with BYxxx parts
+    as packed integers. This follows the same steps (and gives the same results) as the
+    L{Recurrence} generateXXXSet methods, but avoids creating L{DateTime} objects for the
+    intermediate candidates.
+    """
+
+    @staticmethod
+    def supports(rule, start):
+        """
+        Determine whether the rule can be expanded with packed integers. Leap seconds and times
+        on date-only values cannot be represented and need the L{DateTime} based expansion.
+
+        @param rule: the rule to expand
+        @type rule: L{Recurrence}
+        @param start: the DTSTART of the component the rule applies to
+        @type start: L{DateTime}
+        """
+        if rule.mBySeconds and 60 in rule.mBySeconds:
+            return False
+        if start.isDateOnly() and (rule.mByHours or rule.mByMinutes or rule.mBySeconds):
+            return False
+        return True
+
+    def __init__(self, rule):
+        # Empty lists are treated the same as missing ones
+        self.mFreq = rule.mFreq
+        self.mByMonth = rule.mByMonth or None
+        self.mByWeekNo = rule.mByWeekNo or None
+        self.mByYearDay = rule.mByYearDay or None
+        self.mByMonthDay = rule.mByMonthDay or None
+        self.mByDay = rule.mByDay or None
+        self.mByHours = rule.mByHours or None
+        self.mByMinutes = rule.mByMinutes or None
+        self.mBySeconds = rule.mBySeconds or None
+        self.mBySetPos = rule.mBySetPos or None
+        self.mWeekstart = rule.mWeekstart
+
+    def generateSet(self, start):
+        """
+        Generate the set of instances for the FREQ interval that begins at the specified
+        date-time.
+
+        @param start: the start of the FREQ interval
+        @type start: L{DateTime}
+        @return: the packed instances, sorted and with invalid dates removed
+        @rtype: L{list} of L{int}
+        """
+        items = [packDateTime(start)]
+
+        freq = self.mFreq
+        if freq == definitions.eRecurrence_YEARLY:
+            items = self.generateYearlySet(items)
+        elif freq == definitions.eRecurrence_MONTHLY:
+            items = self.generateMonthlySet(items)
+        elif freq == definitions.eRecurrence_WEEKLY:
+            items = self.generateWeeklySet(items)
+        else:
+            items = self.generateDailySet(items)
+
+        if items:
+            # Remove invalid items before BYSETPOS
+            items = filter(self.valid, items)
+
+            items.sort()
+            if self.mBySetPos is not None:
+                items = self.bySetPosLimit(items)
+                items.sort()
+
+        return items
+
+    def generateYearlySet(self, items):
+        # All possible BYxxx are valid, though some combinations are not
+
+        if self.mByMonth is not None:
+            items = self.byMonthExpand(items)
+
+        if self.mByWeekNo is not None:
+            items = self.byWeekNoExpand(items)
+
+        if self.mByYearDay is not None:
+            items = self.byYearDayExpand(items)
+
+        if self.mByMonthDay is not None:
+            items = self.byMonthDayExpand(items)
+
+        if self.mByDay is not None:
+            # BYDAY is complicated:
+            # if BYDAY is included with BYYEARDAY or BYMONTHDAY then it
+            # contracts the recurrence set
+            # else it expands it, but the expansion depends on the frequency
+            # and other BYxxx periodicities
+
+            if self.mByYearDay is not None or self.mByMonthDay is not None:
+                items = self.byDayLimit(items)
+            elif self.mByWeekNo is not None:
+                items = self.byDayExpandWeekly(items)
+            elif self.mByMonth is not None:
+                items = self.byDayExpandMonthly(items)
+            else:
+                items = self.byDayExpandYearly(items)
+
+        return self.byTimeExpand(items, 0)
+
+    def generateMonthlySet(self, items):
+        # Cannot have BYYEARDAY and BYWEEKNO
+
+        if self.mByMonth is not None:
+            # BYMONTH limits the range of possible values
+            items = self.byMonthLimit(items)
+            if not items:
+                return items
+
+        if self.mByMonthDay is not None:
+            items = self.byMonthDayExpand(items)
+
+        if self.mByDay is not None:
+            # BYDAY is complicated:
+            # if BYDAY is included with BYYEARDAY or BYMONTHDAY then it
+            # contracts the recurrence set
+            # else it expands it, but the expansion depends on the frequency
+            # and other BYxxx periodicities
+
+            if self.mByYearDay is not None or self.mByMonthDay is not None:
+                items = self.byDayLimit(items)
+            else:
+                items = self.byDayExpandMonthly(items)
+
+        return self.byTimeExpand(items, 0)
+
+    def generateWeeklySet(self, items):
+        # Cannot have BYYEARDAY and BYMONTHDAY
+
+        if self.mByMonth is not None:
+            # BYMONTH limits the range of possible values
+            items = self.byMonthLimit(items)
+            if not items:
+                return items
+
+        if self.mByWeekNo is not None:
+            items = self.byWeekNoLimit(items)
+            if not items:
+                return items
+
+        if self.mByDay is not None:
+            items = self.byDayExpandWeekly(items)
+
+        return self.byTimeExpand(items, 0)
+
+    def generateDailySet(self, items):
+        # DAILY, HOURLY, MINUTELY and SECONDLY only differ in which of BYHOUR, BYMINUTE and
+        # BYSECOND limit rather than expand the set. Cannot have BYYEARDAY.
+
+        if self.mByMonth is not None:
+            # BYMONTH limits the range of possible values
+            items = self.byMonthLimit(items)
+            if not items:
+                return items
+
+        if self.mByWeekNo is not None:
+            items = self.byWeekNoLimit(items)
+            if not items:
+                return items
+
+        if self.mByMonthDay is not None:
+            items = self.byMonthDayLimit(items)
+            if not items:
+                return items
+
+        if self.mByDay is not None:
+            items = self.byDayLimit(items)
+            if not items:
+                return items
+
+        if self.mFreq == definitions.eRecurrence_HOURLY:
+            limits = 1
+        elif self.mFreq == definitions.eRecurrence_MINUTELY:
+            limits = 2
+        elif self.mFreq == definitions.eRecurrence_SECONDLY:
+            limits = 3
+        else:
+            limits = 0
+        return self.byTimeExpand(items, limits)
+
+    def byTimeExpand(self, items, limits):
+        """
+        Apply BYHOUR, BYMINUTE and BYSECOND to the set, with the first L{limits} of those
+        limiting rather than expanding the set.
+        """
+
+        for ctr, by, divisor, period in (
+            (1, self.mByHours, 3600, 24),
+            (2, self.mByMinutes, 60, 60),
+            (3, self.mBySeconds, 1, 60),
+        ):
+            if by is not None:
+                if ctr <= limits:
+                    items = [item for item in items if (item % 86400) / divisor % period in by]
+                    if not items:
+                        return items
+                else:
+                    output = []
+                    for item in items:
+                        base = item - (item % 86400) / divisor % period * divisor
+                        for value in by:
+                            output.append(base + value * divisor)
+                    items = output
+
+        return items
+
+    def valid(self, item):
+        year, month, day, _ignore_seconds = unpackInstance(item)
+        return 0 < day <= utils.daysInMonth(month, year)
+
+    def byMonthExpand(self, items):
+        output = []
+        for item in items:
+            year, _ignore_month, day, seconds = unpackInstance(item)
+            for month in self.mByMonth:
+                output.append(packInstance(year, month, day, seconds))
+        return output
+
+    def byWeekNoExpand(self, items):
+        output = []
+        for item in items:
+            year, month, day, seconds = unpackInstance(item)
+            for weekno in self.mByWeekNo:
+                output.append(packInstance(*setWeekNo(year, month, day, weekno) + (seconds,)))
+        return output
+
+    def byYearDayExpand(self, items):
+        output = []
+        for item in items:
+            year, month, day, seconds = unpackInstance(item)
+            for yearday in self.mByYearDay:
+                output.append(packInstance(*setYearDay(year, month, day, yearday, allow_invalid=True) + (seconds,)))
+        return output
+
+    def byMonthDayExpand(self, items):
+        output = []
+        for item in items:
+            year, month, day, seconds = unpackInstance(item)
+            for monthday in self.mByMonthDay:
+                if monthday > 0:
+                    output.append(packInstance(year, month, monthday, seconds))
+                elif monthday < 0:
+                    output.append(packInstance(year, month, utils.daysInMonth(month, year) + monthday + 1, seconds))
+                else:
+                    output.append(item)
+        return output
+
+    def byDayExpandYearly(self, items):
+        output = []
+        for item in items:
+            year, _ignore_month, _ignore_day, seconds = unpackInstance(item)
+            for offset, weekday in self.mByDay:
+                # Numeric value means specific instance
+                if offset != 0:
+                    output.append(packInstance(*setDayOfWeekInYear(year, offset, weekday) + (seconds,)))
+                else:
+                    # Every matching day in the year
+                    for i in range(1, 54):
+                        new_year, new_month, new_day = setDayOfWeekInYear(year, i, weekday)
+                        if new_year == year:
+                            output.append(packInstance(new_year, new_month, new_day, seconds))
+        return output
+
+    def byDayExpandMonthly(self, items):
+        output = []
+        for item in items:
+            year, month, _ignore_day, seconds = unpackInstance(item)
+            for offset, weekday in self.mByDay:
+                # Numeric value means specific instance
+                if offset != 0:
+                    output.append(packInstance(*setDayOfWeekInMonth(year, month, offset, weekday, allow_invalid=True) + (seconds,)))
+                else:
+                    # Every matching day in the month (which may include an invalid sixth one)
+                    for i in range(1, 7):
+                        output.append(packInstance(*setDayOfWeekInMonth(year, month, i, weekday, allow_invalid=True) + (seconds,)))
+        return output
+
+    def byDayExpandWeekly(self, items):
+        # Must take into account the WKST value
+        output = []
+        for item in items:
+            year, month, day, seconds = unpackInstance(item)
+            for offset, weekday in self.mByDay:
+                # Numeric values are meaningless so ignore them
+                if offset == 0:
+                    # Determine amount of offset to apply to shift it to the start of the week
+                    # (backwards)
+                    week_start_offset = self.mWeekstart - utils.dayOfWeek(year, month, day)
+                    if week_start_offset > 0:
+                        week_start_offset -= 7
+
+                    # Determine amount of offset from the start of the week to the day we want
+                    # (forwards)
+                    day_in_week_offset = weekday - self.mWeekstart
+                    if day_in_week_offset < 0:
+                        day_in_week_offset += 7
+
+                    output.append(packInstance(*normaliseDate(year, month, day + week_start_offset + day_in_week_offset) + (seconds,)))
+        return output
+
+    def byMonthLimit(self, items):
+        return [item for item in items if unpackInstance(item)[1] in self.mByMonth]
+
+    def byWeekNoLimit(self, items):
+        # Only positive week numbers are matched
+        output = []
+        for item in items:
+            year, month, day, _ignore_seconds = unpackInstance(item)
+            if utils.weekNumber(year, month, day) in self.mByWeekNo:
+                output.append(item)
+        return output
+
+    def byMonthDayLimit(self, items):
+        output = []
+        for item in items:
+            year, month, day, _ignore_seconds = unpackInstance(item)
+            from_end = day - 1 - utils.daysInMonth(month, year)
+            for monthday in self.mByMonthDay:
+                if monthday > 0 and day == monthday or monthday < 0 and from_end == monthday:
+                    output.append(item)
+                    break
+        return output
+
+    def byDayLimit(self, items):
+        output = []
+        for item in items:
+            year, month, day, _ignore_seconds = unpackInstance(item)
+            weekday = utils.dayOfWeek(year, month, day)
+            for offset, by_weekday in self.mByDay:
+                if by_weekday != weekday:
+                    continue
+                if offset == 0 or setDayOfWeekInMonth(year, month, offset, weekday) == (year, month, day):
+                    output.append(item)
+                    break
+        return output
+
+    def bySetPosLimit(self, items):
+        # The input items MUST be sorted in order for this to work properly
+        output = []
+        input_size = len(items)
+        for setpos in self.mBySetPos:
+            if setpos > 0:
+                # Positive values are offset from the start
+                if setpos <= input_size:
+                    output.append(items[setpos - 1])
+            elif setpos < 0:
+                # Negative values are offset from the end
+                if -setpos <= input_size:
+                    output.append(items[input_size + setpos])
+        return output
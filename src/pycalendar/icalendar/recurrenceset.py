@@ -14,8 +14,8 @@
 #    limitations under the License.
 ##
 
+from heapq import merge
 from pycalendar.icalendar.exceptions import TooManyInstancesError
-from pycalendar.utils import set_difference
 
 
 class RecurrenceSet(object):
@@ -165,67 +165,213 @@ class RecurrenceSet(object):
     def getExperiods(self):
         return self.mExperiods
 
-    def expand(self, start, range, items, float_offset=0, maxInstances=None):
+    def expand(self, start, range, items, float_offset=0, maxInstances=None, limit=None, after=None):
+        """
+        Expand the set into the instances within the specified period, in time order.
+
+        With a L{limit} the rules are only expanded as far as is needed for that many instances.
+        The last instance returned can then be passed as L{after} to get the following ones.
+
+        @param start: the DTSTART of the component the set applies to
+        @type start: L{DateTime}
+        @param range: the period to expand over
+        @type range: L{Period}
+        @param items: list to add the instances to
+        @type items: L{list}
+        @param float_offset: offset to apply to UNTIL when DTSTART is floating
+        @type float_offset: L{int}
+        @param maxInstances: raise L{TooManyInstancesError} if there are more instances than this
+        @type maxInstances: L{int}
+        @param limit: the maximum number of instances to return
+        @type limit: L{int}
+        @param after: only return instances after this one
+        @type after: L{DateTime}
+        @return: without a L{limit}, L{True} if any instances were left out (e.g. because they
+            are outside the period), with a L{limit}, L{True} if there are more instances to
+            come
+        @rtype: L{bool}
+        """
+
         # Need to return whether the limit was applied or not
         limited = False
 
-        # Now create list of items to include
+        # With a limit, rules are expanded lazily. The range is not narrowed to the cursor, as
+        # that would compare a date-only cursor by date alone - instead anything not after the
+        # cursor's posix time is skipped when merging.
+        lazy = limit is not None
+
+        # Now create lists of items to include - one for each source of instances, in time order
         include = []
+        total = 0
 
         # Always include the initial DTSTART if within the range
         if range.isDateWithinPeriod(start):
-            include.append(start)
+            include.append([start])
+            total += 1
         else:
             limited = True
 
         # RRULES
         for iter in self.mRrules:
-            if iter.expand(start, range, include, float_offset=float_offset, maxInstances=maxInstances):
-                limited = True
+            if lazy:
+                include.append(iter.iterInstances(start, range, float_offset=float_offset))
+            else:
+                instances = []
+                if iter.expand(start, range, instances, float_offset=float_offset, maxInstances=maxInstances):
+                    limited = True
+                include.append(self.timeOrder(instances))
+                total += len(instances)
 
         # RDATES
+        instances = []
         for iter in self.mRdates:
             if range.isDateWithinPeriod(iter):
-                include.append(iter)
-                if maxInstances and len(include) > maxInstances:
+                instances.append(iter)
+                if maxInstances and total + len(instances) > maxInstances:
                     raise TooManyInstancesError("Too many instances")
             else:
                 limited = True
         for iter in self.mRperiods:
             if range.isPeriodOverlap(iter):
-                include.append(iter.getStart())
-                if maxInstances and len(include) > maxInstances:
+                instances.append(iter.getStart())
+                if maxInstances and total + len(instances) > maxInstances:
                     raise TooManyInstancesError("Too many instances")
             else:
                 limited = True
+        include.append(self.timeOrder(instances))
 
-        # Make sure the list is unique
-        include = [x for x in set(include)]
-        include.sort(key=lambda x: x.getPosixTime())
-
-        # Now create list of items to exclude
+        # Now create lists of items to exclude
         exclude = []
 
         # EXRULES
         for iter in self.mExrules:
-            iter.expand(start, range, exclude, float_offset=float_offset)
+            if lazy:
+                exclude.append(iter.iterInstances(start, range, float_offset=float_offset))
+            else:
+                instances = []
+                iter.expand(start, range, instances, float_offset=float_offset)
+                exclude.append(self.timeOrder(instances))
 
         # EXDATES
+        instances = []
         for iter in self.mExdates:
             if range.isDateWithinPeriod(iter):
-                exclude.append(iter)
+                instances.append(iter)
         for iter in self.mExperiods:
             if range.isPeriodOverlap(iter):
-                exclude.append(iter.getStart())
-
-        # Make sure the list is unique
-        exclude = [x for x in set(exclude)]
-        exclude.sort(key=lambda x: x.getPosixTime())
+                instances.append(iter.getStart())
+        exclude.append(self.timeOrder(instances))
 
         # Add difference between to the two sets (include - exclude) to the
-        # results
-        items.extend(set_difference(include, exclude))
-        return limited
+        # results, in time order, stopping once the limit is reached
+        after_key = after.getPosixTime() if after is not None else None
+        count = 0
+        for instance in self.mergeInstances(include, exclude):
+            if after_key is not None and instance.getPosixTime() <= after_key:
+                limited = True
+                continue
+            if lazy and count == limit:
+                return True
+            items.append(instance)
+            count += 1
+        return limited and not lazy
+
+    def iterInstances(self, start, range, float_offset=0):
+        """
+        Lazily generate the instances of the set within the specified period, in time order. As
+        with L{Recurrence.iterInstances} the instance caches of the rules are neither used nor
+        updated, and rules without a COUNT skip straight to the period.
+
+        @param start: the DTSTART of the component the set applies to
+        @type start: L{DateTime}
+        @param range: the period to generate instances for
+        @type range: L{Period}
+        @param float_offset: offset to apply to UNTIL when DTSTART is floating
+        @type float_offset: L{int}
+        """
+
+        # Instances to include - DTSTART, RRULEs and RDATEs
+        include = []
+        if range.isDateWithinPeriod(start):
+            include.append([start])
+        for iter in self.mRrules:
+            include.append(iter.iterInstances(start, range, float_offset=float_offset))
+        instances = [iter for iter in self.mRdates if range.isDateWithinPeriod(iter)]
+        instances.extend([iter.getStart() for iter in self.mRperiods if range.isPeriodOverlap(iter)])
+        include.append(self.timeOrder(instances))
+
+        # Instances to exclude - EXRULEs and EXDATEs
+        exclude = []
+        for iter in self.mExrules:
+            exclude.append(iter.iterInstances(start, range, float_offset=float_offset))
+        instances = [iter for iter in self.mExdates if range.isDateWithinPeriod(iter)]
+        instances.extend([iter.getStart() for iter in self.mExperiods if range.isPeriodOverlap(iter)])
+        exclude.append(self.timeOrder(instances))
+
+        return self.mergeInstances(include, exclude)
+
+    @staticmethod
+    def timeOrder(instances):
+        return sorted(instances, key=lambda x: x.getPosixTime())
+
+    @staticmethod
+    def mergeInstances(include, exclude):
+        """
+        Merge sequences of instances into a single time ordered sequence without duplicates and
+        without any of the excluded instances. Each sequence must be in time order and is only
+        read as far as needed.
+
+        @param include: the sequences of instances to include
+        @type include: L{list} of iterables of L{DateTime}
+        @param exclude: the sequences of instances to exclude
+        @type exclude: L{list} of iterables of L{DateTime}
+        @return: the instances
+        @rtype: iterator of L{DateTime}
+        """
+
+        excluded = RecurrenceSet.uniqueInstances(exclude)
+        next_exclude = next(excluded, None)
+        matches = []
+        match_key = None
+        for key, instance in RecurrenceSet.uniqueInstances(include):
+            # Find the excluded instances at the same time
+            if key != match_key:
+                match_key = key
+                matches = []
+                while next_exclude is not None and next_exclude[0] <= key:
+                    if next_exclude[0] == key:
+                        matches.append(next_exclude[1])
+                    next_exclude = next(excluded, None)
+            if not any([instance == match for match in matches]):
+                yield instance
+
+    @staticmethod
+    def uniqueInstances(sources):
+        """
+        Merge time ordered sequences of instances into a single sequence of (posix time, instance)
+        in time order, skipping any instance equal to an earlier one with the same posix time
+        (i.e. the same as de-duplicating with a L{set}).
+        """
+
+        seen = []
+        seen_key = None
+        streams = [RecurrenceSet.keyedInstances(source, instances) for source, instances in enumerate(sources)]
+        for key, _ignore_source, _ignore_position, instance in merge(*streams):
+            if key != seen_key:
+                seen_key = key
+                seen = []
+            elif any([instance == other for other in seen]):
+                continue
+            seen.append(instance)
+            yield key, instance
+
+    @staticmethod
+    def keyedInstances(source, instances):
+        # Each instance is keyed with the position of its sequence in the sources, and its
+        # position in that sequence, so that ties are resolved in the order the instances were
+        # provided without ever comparing the instances themselves
+        for position, instance in enumerate(instances):
+            yield instance.getPosixTime(), source, position, instance
 
     def changed(self):
         # RRULES
@@ -1228,3 +1228,58 @@ END:VCALENDAR
             if master is None:
                 master = ""
             self.assertEqual(str(master), result, "Failed in %s: got %s, expected %s" % (title, master, result))
+
+    def testGetTimezone(self):
+
+        data = """BEGIN:VCALENDAR
+VERSION:2.0
+CALSCALE:GREGORIAN
+PRODID:-//mulberrymail.com//Mulberry v4.0//EN
+BEGIN:VTIMEZONE
+TZID:Etc/GMT+1
+BEGIN:STANDARD
+DTSTART:18000101T000000
+RDATE:18000101T000000
+TZNAME:GMT+1
+TZOFFSETFROM:-0100
+TZOFFSETTO:-0100
+END:STANDARD
+END:VTIMEZONE
+BEGIN:VTIMEZONE
+TZID:Etc/GMT+2
+BEGIN:STANDARD
+DTSTART:18000101T000000
+RDATE:18000101T000000
+TZNAME:GMT+2
+TZOFFSETFROM:-0200
+TZOFFSETTO:-0200
+END:STANDARD
+END:VTIMEZONE
+END:VCALENDAR
+""".replace("\n", "\r\n")
+
+        calendar = Calendar.parseText(data)
+        tz1 = calendar.getTimezone("Etc/GMT+1")
+        tz2 = calendar.getTimezone("Etc/GMT+2")
+        self.assertEqual(tz1.getID(), "Etc/GMT+1")
+        self.assertEqual(tz2.getID(), "Etc/GMT+2")
+        self.assertTrue(calendar.getTimezone("Etc/GMT+3") is None)
+        self.assertEqual(calendar.duplicate().getTimezone("Etc/GMT+2").getID(), "Etc/GMT+2")
+
+        # Removing the timezone removes it from the map, leaving any other with the same TZID
+        other = tz1.duplicate()
+        calendar.addComponent(other)
+        self.assertTrue(calendar.getTimezone("Etc/GMT+1") is tz1)
+        calendar.removeComponent(tz1)
+        self.assertTrue(calendar.getTimezone("Etc/GMT+1") is other)
+        calendar.removeComponent(other)
+        self.assertTrue(calendar.getTimezone("Etc/GMT+1") is None)
+
+        # A timezone whose TZID is changed after it was added is found by its new TZID
+        tz2.editProperty("TZID", "Etc/GMT+3")
+        tz2.finalise()
+        self.assertTrue(calendar.getTimezone("Etc/GMT+3") is tz2)
+        self.assertTrue(calendar.getTimezone("Etc/GMT+2") is None)
+
+        calendar.removeAllComponent()
+        self.assertTrue(calendar.getTimezone("Etc/GMT+3") is None)
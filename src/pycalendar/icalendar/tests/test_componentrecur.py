@@ -13,7 +13,10 @@
 #    limitations under the License.
 ##
 
+from pycalendar.datetime import DateTime
 from pycalendar.icalendar.calendar import Calendar
+from pycalendar.period import Period
+from pycalendar.timezone import Timezone
 import cStringIO as StringIO
 import unittest
 
@@ -65,3 +68,172 @@ END:VCALENDAR
 
         self.assertEqual(data[0], str(cal1))
         self.assertEqual(data[1], str(cal2))
+
+    def testExpandMergesInstances(self):
+
+        data = """BEGIN:VCALENDAR
+VERSION:2.0
+CALSCALE:GREGORIAN
+PRODID:-//mulberrymail.com//Mulberry v4.0//EN
+BEGIN:VEVENT
+UID:C3184A66-1ED0-11D9-A5E0-000A958A3252
+DTSTART:20140106T090000Z
+DURATION:PT1H
+DTSTAMP:20020101T000000Z
+RRULE:FREQ=WEEKLY;BYDAY=MO,WE;COUNT=8
+EXRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=WE;COUNT=2
+RDATE:20140115T090000Z,20140104T090000Z,20140120T120000Z,20140108T090000Z
+EXDATE:20140113T090000Z,20140120T120000Z,20140201T090000Z
+SUMMARY:Meeting
+END:VEVENT
+END:VCALENDAR
+""".replace("\n", "\r\n")
+
+        cal = Calendar()
+        cal.parse(StringIO.StringIO(data))
+        vevent = cal.getComponents()[0]
+        period = Period(DateTime(2014, 1, 5, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2014, 2, 1, 0, 0, 0, tzid=Timezone(utc=True)))
+        items = []
+        vevent.getRecurrenceSet().expand(vevent.getStart(), period, items)
+
+        # In time order, with duplicates and exclusions removed
+        self.assertEqual(
+            [item.getText() for item in items],
+            [
+                "20140106T090000Z",
+                "20140115T090000Z",
+                "20140120T090000Z",
+                "20140122T090000Z",
+                "20140127T090000Z",
+                "20140129T090000Z",
+            ]
+        )
+
+    def testExpandPeriodLimit(self):
+
+        data = """BEGIN:VCALENDAR
+VERSION:2.0
+CALSCALE:GREGORIAN
+PRODID:-//mulberrymail.com//Mulberry v4.0//EN
+BEGIN:VEVENT
+UID:C3184A66-1ED0-11D9-A5E0-000A958A3252
+DTSTART:20140106T090000Z
+DURATION:PT1H
+DTSTAMP:20020101T000000Z
+RRULE:FREQ=DAILY
+EXDATE:20140109T090000Z
+SUMMARY:Meeting
+END:VEVENT
+BEGIN:VEVENT
+UID:C3184A66-1ED0-11D9-A5E0-000A958A3252
+RECURRENCE-ID:20140110T090000Z
+DTSTART:20140110T100000Z
+DURATION:PT1H
+DTSTAMP:20020101T000000Z
+SUMMARY:Meeting
+END:VEVENT
+END:VCALENDAR
+""".replace("\n", "\r\n")
+
+        cal = Calendar()
+        cal.parse(StringIO.StringIO(data))
+        master = [component for component in cal.getComponents() if not component.isRecurrenceInstance()][0]
+        period = Period(DateTime(2014, 1, 7, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2015, 1, 1, 0, 0, 0, tzid=Timezone(utc=True)))
+
+        # Pages of instances, skipping the excluded ones and with the overridden one in its place
+        pages = []
+        cursor = None
+        for _ignore in range(3):
+            results = []
+            cursor = master.expandPeriod(period, results, limit=2, after=cursor)
+            pages.append(results)
+        self.assertEqual([[result.getInstanceStart().getText() for result in page] for page in pages], [
+            ["20140107T090000Z", "20140108T090000Z"],
+            ["20140110T100000Z", "20140111T090000Z"],
+            ["20140112T090000Z", "20140113T090000Z"],
+        ])
+        self.assertTrue(pages[1][0].getOwner().isRecurrenceInstance())
+        self.assertFalse(pages[1][1].getOwner().isRecurrenceInstance())
+        self.assertEqual(cursor.getText(), "20140113T090000Z")
+
+        # Paging one at a time gives the same instances as expanding the master and override
+        # without a limit
+        january = Period(DateTime(2014, 1, 7, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2014, 2, 1, 0, 0, 0, tzid=Timezone(utc=True)))
+        expected = []
+        for component in cal.getComponents():
+            component.expandPeriod(january, expected)
+        paged = []
+        cursor = None
+        while True:
+            results = []
+            cursor = master.expandPeriod(january, results, limit=1, after=cursor)
+            self.assertTrue(len(results) <= 1)
+            paged.extend(results)
+            if cursor is None:
+                break
+        self.assertEqual(
+            sorted([result.getInstanceStart().getText() for result in paged]),
+            sorted([result.getInstanceStart().getText() for result in expected]),
+        )
+
+        # The end of the period
+        results = []
+        cursor = master.expandPeriod(period, results, limit=2, after=DateTime(2014, 12, 30, 9, 0, 0, tzid=Timezone(utc=True)))
+        self.assertEqual([result.getInstanceStart().getText() for result in results], ["20141231T090000Z"])
+        self.assertTrue(cursor is None)
+
+    def testExpandLimitDateCursor(self):
+
+        data = """BEGIN:VCALENDAR
+VERSION:2.0
+CALSCALE:GREGORIAN
+PRODID:-//mulberrymail.com//Mulberry v4.0//EN
+BEGIN:VTIMEZONE
+TZID:America/New_York
+BEGIN:DAYLIGHT
+DTSTART:20070311T020000
+RRULE:FREQ=YEARLY;BYDAY=2SU;BYMONTH=3
+TZNAME:EDT
+TZOFFSETFROM:-0500
+TZOFFSETTO:-0400
+END:DAYLIGHT
+BEGIN:STANDARD
+DTSTART:20071104T020000
+RRULE:FREQ=YEARLY;BYDAY=1SU;BYMONTH=11
+TZNAME:EST
+TZOFFSETFROM:-0400
+TZOFFSETTO:-0500
+END:STANDARD
+END:VTIMEZONE
+BEGIN:VEVENT
+UID:C3184A66-1ED0-11D9-A5E0-000A958A3252
+DTSTART;TZID=America/New_York:20140531T040800
+DURATION:PT1H
+DTSTAMP:20020101T000000Z
+RRULE:FREQ=HOURLY;BYDAY=FR,SU,SA
+RDATE;VALUE=DATE:20140601,20140607
+SUMMARY:Meeting
+END:VEVENT
+END:VCALENDAR
+""".replace("\n", "\r\n")
+
+        cal = Calendar()
+        cal.parse(StringIO.StringIO(data))
+        vevent = [component for component in cal.getComponents() if component.getType() == "VEVENT"][0]
+        period = Period(DateTime(2014, 5, 1, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2014, 6, 10, 0, 0, 0, tzid=Timezone(utc=True)))
+        items = []
+        vevent.getRecurrenceSet().expand(vevent.getStart(), period, items)
+        self.assertTrue("20140607" in [item.getText() for item in items])
+
+        # Paging past a date-only RDATE does not lose the date-time instances of the same day
+        for limit in (1, 3,):
+            paged = []
+            cursor = None
+            while True:
+                found = []
+                more = vevent.getRecurrenceSet().expand(vevent.getStart(), period, found, limit=limit, after=cursor)
+                paged.extend(found)
+                if not more:
+                    break
+                cursor = found[-1]
+            self.assertEqual([item.getText() for item in paged], [item.getText() for item in items], "Failed limit: {}".format(limit))
@@ -17,6 +17,7 @@
 from pycalendar.datetime import DateTime
 from pycalendar.period import Period
 from pycalendar.icalendar.recurrence import Recurrence
+from pycalendar.icalendar.recurrencebatch import expandSeries
 import unittest
 from pycalendar.timezone import Timezone
 import os
@@ -223,3 +224,237 @@ class TestRecurrence(unittest.TestCase):
         items = []
         recur.expand(start, range, items)
         self.assertEqual(len(items), 10)
+
+    def testIterInstances(self):
+
+        recur = Recurrence()
+        recur.parse("FREQ=DAILY")
+
+        start = DateTime(2005, 1, 1, 9, 0, 0, tzid=Timezone(utc=True))
+        range = Period(DateTime(2014, 1, 6, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2014, 1, 13, 0, 0, 0, tzid=Timezone(utc=True)))
+        instances = recur.iterInstances(start, range)
+        self.assertEqual(instances.next(), DateTime(2014, 1, 6, 9, 0, 0, tzid=Timezone(utc=True)))
+        self.assertEqual(instances.next(), DateTime(2014, 1, 7, 9, 0, 0, tzid=Timezone(utc=True)))
+        self.assertEqual(len(list(instances)), 5)
+        self.assertFalse(recur.mCached)
+
+        # Same results as a full expansion
+        range = Period(DateTime(2012, 1, 1, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2017, 1, 1, 0, 0, 0, tzid=Timezone(utc=True)))
+        for rule in ("FREQ=WEEKLY;COUNT=400", "FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1", "FREQ=YEARLY;BYMONTH=2;BYMONTHDAY=29"):
+            recur = Recurrence()
+            recur.parse(rule)
+            items = []
+            recur.expand(start, range, items)
+            self.assertNotEqual(len(items), 0)
+            self.assertEqual(list(recur.iterInstances(start, range)), items, "Failed rule: {}".format(rule))
+
+    def testSkipAhead(self):
+
+        start = DateTime(1995, 1, 31, 9, 0, 0, tzid=Timezone(tzid="America/New_York"))
+        range = Period(DateTime(2014, 3, 1, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2014, 4, 1, 0, 0, 0, tzid=Timezone(utc=True)))
+        early = Period(DateTime(1995, 2, 1, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(1995, 2, 2, 0, 0, 0, tzid=Timezone(utc=True)))
+        for rule, count, early_count in (
+            ("FREQ=DAILY", 31, 1),
+            ("FREQ=WEEKLY;INTERVAL=2", 2, 0),
+            ("FREQ=MONTHLY", 1, 0),
+            ("FREQ=HOURLY;INTERVAL=5", 149, 5),
+            ("FREQ=DAILY;UNTIL=20140310T140000Z", 10, 1),
+            ("FREQ=DAILY;UNTIL=20140201T000000Z", 0, 1),
+            ("FREQ=YEARLY;BYMONTH=3;BYDAY=2SU", 1, 0),
+            ("FREQ=MONTHLY;BYDAY=-1FR", 1, 0),
+            ("FREQ=WEEKLY;BYDAY=MO,TH", 9, 0),
+            ("FREQ=YEARLY;BYMONTH=3;BYDAY=2SU;UNTIL=20060402T070000Z", 0, 0),
+        ):
+            recur = Recurrence()
+            recur.parse(rule)
+            items = []
+            self.assertTrue(recur.expand(start, range, items))
+            self.assertEqual(len(items), count, "Failed rule: {}".format(rule))
+            self.assertTrue(len(recur.mRecurrences) <= count + 12, "Failed rule: {}".format(rule))
+
+            # Same results as visiting every instance
+            all_items = []
+            if recur.hasBy():
+                recur.complexExpand(start, range, all_items, 0)
+            else:
+                recur.simpleExpand(start, range, all_items, 0)
+            self.assertEqual(items, [item for item in all_items if range.isDateWithinPeriod(item)], "Failed rule: {}".format(rule))
+
+            # Earlier range re-expands the skipped instances
+            items = []
+            recur.expand(start, early, items)
+            self.assertEqual(len(items), early_count, "Failed rule: {}".format(rule))
+
+    def testIncrementalCache(self):
+
+        start = DateTime(2014, 1, 1, 9, 0, 0, tzid=Timezone(utc=True))
+        for rule in ("FREQ=DAILY;COUNT=40", "FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=20", "FREQ=MONTHLY;BYDAY=-1FR"):
+            recur = Recurrence()
+            recur.parse(rule)
+            first = None
+            for week in range(10):
+                period = Period(DateTime(2014, 1, 1 + 7 * week, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2014, 1, 8 + 7 * week, 0, 0, 0, tzid=Timezone(utc=True)))
+                items = []
+                recur.expand(start, period, items)
+
+                # Cached instances are extended rather than re-generated
+                if first is None and recur.mRecurrences:
+                    first = recur.mRecurrences[0]
+                if first is not None:
+                    self.assertTrue(recur.mRecurrences[0] is first, "Failed rule: {}".format(rule))
+
+                # Same results as a fresh expansion
+                fresh = Recurrence()
+                fresh.parse(rule)
+                fresh_items = []
+                fresh.expand(start, period, fresh_items)
+                self.assertEqual(items, fresh_items, "Failed rule: {} week: {}".format(rule, week))
+
+    def testCachedRangeLookup(self):
+
+        recur = Recurrence()
+        recur.parse("FREQ=DAILY;UNTIL=20201231T235959Z")
+        start = DateTime(2010, 1, 1, 12, 0, 0, tzid=Timezone(tzid="America/New_York"))
+        items = []
+        recur.expand(start, Period(DateTime(2010, 1, 1, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2021, 1, 1, 0, 0, 0, tzid=Timezone(utc=True))), items)
+        self.assertTrue(recur.mFullyCached)
+        self.assertTrue(recur.mRecurrencesSorted)
+        self.assertEqual(len(recur.mRecurrenceKeys), len(recur.mRecurrences))
+
+        for period in (
+            Period(DateTime(2015, 3, 8, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2015, 3, 10, 0, 0, 0, tzid=Timezone(utc=True))),
+            Period(DateTime(2015, 3, 8, 12, 0, 0, tzid=Timezone(tzid="America/New_York")), DateTime(2015, 3, 10, 12, 0, 0, tzid=Timezone(tzid="America/New_York"))),
+            Period(DateTime(2015, 3, 8), DateTime(2015, 3, 10)),
+            Period(DateTime(2015, 3, 8, 12, 0, 0), DateTime(2015, 3, 10, 12, 0, 0)),
+            Period(DateTime(2009, 1, 1), DateTime(2030, 1, 1)),
+        ):
+            items = []
+            limited = recur.expand(start, period, items)
+            self.assertEqual(items, [item for item in recur.mRecurrences if period.isDateWithinPeriod(item)], "Failed period: {}".format(period))
+            self.assertEqual(limited, len(items) != len(recur.mRecurrences), "Failed period: {}".format(period))
+
+    def testExpansionMemo(self):
+
+        Recurrence.clearExpansionMemo()
+        self.assertEqual(Recurrence.getExpansionMemoStats(), {"hits": 0, "misses": 0, "size": 0})
+
+        start = DateTime(2014, 1, 1, 9, 0, 0, tzid=Timezone(tzid="America/New_York"))
+        period = Period(DateTime(2014, 3, 1, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2014, 4, 1, 0, 0, 0, tzid=Timezone(utc=True)))
+        results = []
+        for _ignore in range(3):
+            recur = Recurrence()
+            recur.parse("FREQ=WEEKLY;BYDAY=MO,TH")
+            items = []
+            recur.expand(start.duplicate(), period, items)
+            results.append(items)
+
+        # Only the first rule is expanded and the others get copies of its instances
+        self.assertEqual(Recurrence.getExpansionMemoStats(), {"hits": 2, "misses": 1, "size": 1})
+        self.assertEqual(len(results[0]), 9)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+        self.assertFalse(results[0][0] is results[1][0])
+
+        # A different float offset or period is a different expansion
+        recur.expand(start.duplicate(), period, [], float_offset=3600)
+        longer = []
+        recur.expand(start.duplicate(), Period(period.getStart(), DateTime(2014, 5, 1, 0, 0, 0, tzid=Timezone(utc=True))), longer)
+        self.assertEqual(Recurrence.getExpansionMemoStats(), {"hits": 2, "misses": 3, "size": 3})
+
+        # The memo is bounded by the number of instances it holds
+        self.assertEqual(Recurrence.sExpansionMemo.getWeight(), 9 + 9 + len(longer))
+
+        # Expansions with too many instances are not memoized
+        old_max = Recurrence.cExpansionMemoMaxInstances
+        Recurrence.cExpansionMemoMaxInstances = len(longer) - 1
+        try:
+            recur = Recurrence()
+            recur.parse("FREQ=WEEKLY;BYDAY=TU,FR")
+            recur.expand(start.duplicate(), Period(period.getStart(), DateTime(2014, 5, 1, 0, 0, 0, tzid=Timezone(utc=True))), [])
+            self.assertEqual(Recurrence.getExpansionMemoStats(), {"hits": 2, "misses": 4, "size": 3})
+        finally:
+            Recurrence.cExpansionMemoMaxInstances = old_max
+
+        Recurrence.clearExpansionMemo()
+        self.assertEqual(Recurrence.getExpansionMemoStats(), {"hits": 0, "misses": 0, "size": 0})
+
+    def testPackedSets(self):
+
+        examples = os.path.join(os.path.dirname(__file__), "rrule_examples.json")
+        with open(examples) as f:
+            examples = json.loads(f.read())
+        rules = [(i["rule"], DateTime.parseText(i["start"]), DateTime.parseText(i["end"])) for i in examples]
+
+        start = DateTime(2011, 3, 13, 1, 30, 0, tzid=Timezone(tzid="America/New_York"))
+        end = DateTime(2016, 1, 1, 0, 0, 0, tzid=Timezone(utc=True))
+        rules.extend([(rule, start, end) for rule in self.items])
+        rules.extend([(rule, DateTime(2012, 2, 29), DateTime(2020, 1, 1)) for rule in (
+            "FREQ=YEARLY;BYMONTHDAY=-1,29;BYMONTH=2",
+            "FREQ=YEARLY;BYYEARDAY=60,-306,366,-366",
+            "FREQ=YEARLY;BYWEEKNO=-1,1,53;BYDAY=MO,SU",
+            "FREQ=MONTHLY;BYDAY=5FR,-5MO,-1SA",
+            "FREQ=MONTHLY;BYMONTHDAY=31;BYDAY=FR",
+            "FREQ=DAILY;BYWEEKNO=1,52;BYMONTHDAY=-1,2",
+            "FREQ=WEEKLY;BYMONTH=2;BYDAY=TU,SA;BYSETPOS=1,-1;WKST=SA",
+        )])
+
+        for rule, start, end in rules:
+            results = []
+            for packed in (False, True):
+                recur = Recurrence()
+                recur.parse(rule)
+                items = []
+                Recurrence.cUsePackedSets = packed
+                try:
+                    recur.expand(start, Period(start, end), items)
+                finally:
+                    Recurrence.cUsePackedSets = True
+                results.append([item.getText() for item in items])
+            self.assertEqual(results[0], results[1], msg="Failed rule: {} {}".format(rule, start))
+
+    def testExpandSeries(self):
+
+        rules = (
+            "FREQ=DAILY",
+            "FREQ=DAILY;INTERVAL=3;COUNT=20",
+            "FREQ=DAILY;BYDAY=MO,WE,FR",
+            "FREQ=DAILY;BYMONTHDAY=1,-1;UNTIL=20140401T000000Z",
+            "FREQ=WEEKLY;INTERVAL=2;COUNT=10",
+            "FREQ=WEEKLY;BYDAY=MO,TU,SU;WKST=SU",
+            "FREQ=WEEKLY;INTERVAL=3;BYDAY=FR,SA;UNTIL=20140315T120000Z",
+            "FREQ=MONTHLY",
+            "FREQ=MONTHLY;BYMONTHDAY=31,-31,15,15",
+            "FREQ=MONTHLY;INTERVAL=2;BYDAY=TH,SA",
+            "FREQ=MONTHLY;BYMONTHDAY=13;BYDAY=FR",
+            "FREQ=MONTHLY;BYDAY=-1FR",
+            "FREQ=YEARLY;BYMONTH=2,3",
+        )
+        starts = (
+            DateTime(2013, 10, 31),
+            DateTime(2013, 1, 30, 9, 0, 0),
+            DateTime(2012, 12, 31, 23, 0, 0, tzid=Timezone(utc=True)),
+            DateTime(2011, 3, 13, 2, 30, 0, tzid=Timezone(tzid="America/New_York")),
+        )
+        period = Period(
+            DateTime(2014, 1, 1, 0, 0, 0, tzid=Timezone(utc=True)),
+            DateTime(2014, 6, 1, 0, 0, 0, tzid=Timezone(utc=True)),
+        )
+
+        series = []
+        for rule in rules:
+            for start in starts:
+                recur = Recurrence()
+                recur.parse(rule)
+                series.append((start.duplicate(), recur))
+
+        # Repeated items are expanded too
+        results = expandSeries(series + series[:3], period, -18000)
+        self.assertEqual(len(results), len(series) + 3)
+        for (start, recur), items in zip(series + series[:3], results):
+            expected = []
+            recur.expand(start, period, expected, -18000)
+            self.assertEqual(
+                [item.getText() for item in items],
+                [item.getText() for item in expected],
+                msg="Failed rule: {} {}".format(recur.getText(), start)
+            )
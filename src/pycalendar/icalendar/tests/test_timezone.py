@@ -246,14 +246,66 @@ END:VCALENDAR
                 self.assertEqual(tzoffset, offset * 60 * 60, "Failed to match offset for %s at %s with caching, reversed" % (tz.getID(), dt,))
 
             for dt, relative_to_utc, offset in offsets:
-                tz.mCachedExpandAllMax = None
+                tz.mTransitionWindows.clear()
+                tz.mLastTransitionWindow = None
                 tzoffset = tz.getTimezoneOffsetSeconds(dt, relative_to_utc)
                 self.assertEqual(tzoffset, offset * 60 * 60, "Failed to match offset for %s at %s without caching" % (tz.getID(), dt,))
             for dt, relative_to_utc, offset in reversed(offsets):
-                tz.mCachedExpandAllMax = None
+                tz.mTransitionWindows.clear()
+                tz.mLastTransitionWindow = None
                 tzoffset = tz.getTimezoneOffsetSeconds(dt, relative_to_utc)
                 self.assertEqual(tzoffset, offset * 60 * 60, "Failed to match offset for %s at %s without caching, reversed" % (tz.getID(), dt,))
 
+    def testTransitionWindows(self):
+
+        tzdata = """BEGIN:VCALENDAR
+VERSION:2.0
+CALSCALE:GREGORIAN
+PRODID:-//calendarserver.org//Zonal//EN
+BEGIN:VTIMEZONE
+TZID:America/New_York
+BEGIN:DAYLIGHT
+DTSTART:20070311T020000
+RRULE:FREQ=YEARLY;BYDAY=2SU;BYMONTH=3
+TZNAME:EDT
+TZOFFSETFROM:-0500
+TZOFFSETTO:-0400
+END:DAYLIGHT
+BEGIN:STANDARD
+DTSTART:20071104T020000
+RRULE:FREQ=YEARLY;BYDAY=1SU;BYMONTH=11
+TZNAME:EST
+TZOFFSETFROM:-0400
+TZOFFSETTO:-0500
+END:STANDARD
+END:VTIMEZONE
+END:VCALENDAR
+"""
+
+        cal = Calendar.parseText(tzdata.replace("\n", "\r\n"))
+        tz = cal.getComponents()[0]
+
+        # Lookups spread over far more years than the windows cached
+        for year in range(2400, 2007, -3) + range(2008, 2400, 3):
+            for dt, relative_to_utc, offset in (
+                (DateTime(year, 1, 1, 0, 0, 0), False, -5),
+                (DateTime(year, 1, 1, 2, 0, 0), True, -5),
+                (DateTime(year, 7, 1, 12, 0, 0), False, -4),
+                (DateTime(year, 7, 1, 12, 0, 0), True, -4),
+                (DateTime(year, 12, 31, 23, 0, 0), False, -5),
+            ):
+                tzoffset = tz.getTimezoneOffsetSeconds(dt, relative_to_utc)
+                self.assertEqual(tzoffset, offset * 60 * 60, "Failed to match offset for %s at %s" % (tz.getID(), dt,))
+            self.assertEqual(tz.getTimezoneOffsetSecondsForKey(DateTime(year, 7, 1, 12, 0, 0).getLocalKey(), year), -4 * 60 * 60)
+            self.assertEqual(tz.getTimezoneDescriptor(DateTime(year, 7, 1, 12, 0, 0)), "(EDT)")
+            self.assertEqual(tz.getTimezoneDescriptor(DateTime(year, 12, 1, 12, 0, 0)), "(EST)")
+            self.assertTrue(len(tz.mTransitionWindows) <= tz.cTransitionWindows)
+
+        # The sub-components only expand the years needed and do not cache their instances
+        for item in tz.mComponents:
+            for rule in item.mRecurrences.getRules():
+                self.assertFalse(rule.mCached)
+
     def testConversions(self):
 
         tzdata = """BEGIN:VCALENDAR
@@ -300,7 +300,8 @@ class VFreeBusy(Component):
         else:
 
             # Sort the list by period
-            self.mBusyTime.sort(cmp=lambda x, y: x.getPeriod().getStart().compareDateTime(y.getPeriod().getStart()))
+            key = DateTime.sortKey([busy.getPeriod().getStart() for busy in self.mBusyTime])
+            self.mBusyTime.sort(key=lambda x: key(x.getPeriod().getStart()))
 
             # Determine range
             start = DateTime()
@@ -14,6 +14,8 @@
 #    limitations under the License.
 ##
 
+from bisect import bisect_right
+from pycalendar import utils
 from pycalendar.datetime import DateTime
 from pycalendar.icalendar import definitions
 from pycalendar.icalendar.component import Component
@@ -33,7 +35,9 @@ class VTimezone(Component):
 
     propertyValueChecks = ICALENDAR_VALUE_CHECKS
 
-    UTCOFFSET_CACHE_MAX_ENTRIES = 100000
+    # Transitions are cached for windows of this many years, keeping at most this many windows
+    cTransitionWindowYears = 10
+    cTransitionWindows = 20
 
     sortSubComponents = False
 
@@ -41,8 +45,8 @@ class VTimezone(Component):
         super(VTimezone, self).__init__(parent=parent)
         self.mID = ""
         self.mUTCOffsetSortKey = None
-        self.mCachedExpandAllMaxYear = None
-        self.mCachedOffsets = None
+        self.mTransitionWindows = utils.LRUCache(VTimezone.cTransitionWindows)
+        self.mLastTransitionWindow = None
 
     def duplicate(self, parent=None):
         other = super(VTimezone, self).duplicate(parent=parent)
@@ -69,10 +73,13 @@ class VTimezone(Component):
         return self.mID
 
     def finalise(self):
-        # Get TZID
+        # Get TZID, keeping the calendar's map of timezones by TZID up to date
         temp = self.loadValueString(definitions.cICalProperty_TZID)
-        if temp is not None:
+        if temp is not None and temp != self.mID:
+            oldID = self.mID
             self.mID = temp
+            if self.mParentComponent is not None:
+                self.mParentComponent.changedTimezoneID(self, oldID)
 
         # Sort sub-components by DTSTART
         self.mComponents.sort(key=lambda x: x.getStart())
@@ -128,8 +135,9 @@ class VTimezone(Component):
 
     def getTimezoneOffsetSeconds(self, dt, relative_to_utc=False):
         """
-        Caching implementation of expansion. We cache the entire set of transitions up to one year ahead
-        of the requested time.
+        Caching implementation of expansion. We cache the set of transitions for a window of years
+        around the requested time (see L{getTransitionWindow}) and search them by integer key (see
+        L{getTimezoneOffsetSecondsForKey}).
 
         We need to handle calculating the offset based on both a local time and a UTC time. The later
         is needed when converting from one timezone offset to another which is best done by determining
@@ -143,87 +151,140 @@ class VTimezone(Component):
         @type relative_to_utc: L{bool}
         """
 
-        # Need to make the incoming date-time relative to the DTSTART in the
-        # timezone component for proper comparison.
-        # This means making the incoming date-time a floating (no timezone)
-        # item
-        temp = dt.duplicate()
-        temp.setTimezoneID(None)
+        # The local key ignores the time zone of the date-time, so it is compared as a floating
+        # value to the DTSTARTs of the timezone components
+        return self.getTimezoneOffsetSecondsForKey(dt.getOffsetKey(), dt.getYear(), relative_to_utc)
+
+    def getTimezoneOffsetSecondsForKey(self, key, year, relative_to_utc=False):
+        """
+        Same as L{getTimezoneOffsetSeconds} but for a date-time given as an integer key, which
+        needs no L{DateTime} to be created or duplicated. The transitions are searched as a list
+        of integers rather than as L{DateTime}s.
+
+        @param key: the local key (L{DateTime.getLocalKey}) of the date-time, for date-only
+            values the key of the last second of the day
+        @type key: L{int}
+        @param year: the year of the date-time
+        @type year: L{int}
+        @param relative_to_utc: if L{False}, then the key is for the local time for which an
+            offset is desired, if L{True}, then the key is for a UTC time for which an
+            offset is desired.
+        @type relative_to_utc: L{bool}
+        """
 
-        # Check whether we need to recache
-        if self.mCachedExpandAllMaxYear is None or temp.mYear >= self.mCachedExpandAllMaxYear:
-            cacheMax = temp.duplicate()
-            cacheMax.setHHMMSS(0, 0, 0)
-            cacheMax.offsetYear(2)
-            cacheMax.setMonth(1)
-            cacheMax.setDay(1)
-            self.mCachedExpandAll = self.expandAll(None, cacheMax)
-            self.mCachedExpandAllMaxYear = cacheMax.mYear
-            self.mCachedOffsets = {}
-
-        # Now search for the transition just below the time we want
-        if len(self.mCachedExpandAll):
-            cacheKey = (temp.mYear, temp.mMonth, temp.mDay, temp.mHours, temp.mMinutes, relative_to_utc)
-            i = self.mCachedOffsets.get(cacheKey)
-            if i is None:
-                i = VTimezone.tuple_bisect_right(self.mCachedExpandAll, temp, relative_to_utc)
-                if len(self.mCachedOffsets) >= self.UTCOFFSET_CACHE_MAX_ENTRIES:
-                    self.mCachedOffsets = {}
-                self.mCachedOffsets[cacheKey] = i
-            if i != 0:
-                return self.mCachedExpandAll[i - 1][3]
-
-        return 0
+        localKeys, utcKeys, offsets, _ignore_descriptors = self.getTransitionWindow(year)
+        i = bisect_right(utcKeys if relative_to_utc else localKeys, key)
+        return offsets[i - 1] if i != 0 else 0
 
-    def getTimezoneDescriptor(self, dt):
-        result = ""
-
-        # Get the closet matching element to the time
-        found = self.findTimezoneElement(dt)
-
-        # Get it
-        if found is not None:
-            if len(found.getTZName()) == 0:
-                tzoffset = found.getUTCOffset()
-                negative = False
-                if tzoffset < 0:
-                    tzoffset = -tzoffset
-                    negative = True
-                result = ("+", "-")[negative]
-                hours_offset = tzoffset / (60 * 60)
-                if hours_offset < 10:
-                    result += "0"
-                result += str(hours_offset)
-                mins_offset = (tzoffset / 60) % 60
-                if mins_offset < 10:
-                    result += "0"
-                result += str(mins_offset)
-            else:
-                result = "("
-                result += found.getTZName()
-                result += ")"
+    def getTransitionWindow(self, year):
+        """
+        The transitions needed to look up the offset of any local or UTC date-time in the window
+        of years containing the specified year: those from a year before the window to a year
+        after it, preceded by the last transition up to then. Windows are expanded when first
+        needed, with the sub-components only generating the instances close to the window (see
+        L{VTimezoneElement.expandPeriod}), and only a limited number are cached.
+
+        @param year: the year to look up
+        @type year: L{int}
+        @return: the local and UTC keys (see L{DateTime.getLocalKey}) of the transitions, and
+            the UTC offset and time zone descriptor from each onwards, as parallel lists
+        @rtype: L{tuple} of (L{list}, L{list}, L{list}, L{list})
+        """
+
+        # Consecutive lookups are mostly in the same window, which can then skip the LRU update
+        window = year // self.cTransitionWindowYears
+        if self.mLastTransitionWindow is not None and self.mLastTransitionWindow[0] == window:
+            return self.mLastTransitionWindow[1]
+
+        result = self.mTransitionWindows.get(window)
+        if result is None:
+            start = DateTime(window * self.cTransitionWindowYears - 1, 1, 1, 0, 0, 0)
+            end = DateTime((window + 1) * self.cTransitionWindowYears + 1, 1, 1, 0, 0, 0)
+            transitions = self.expandAll(start, end, with_name=True)
+            previous = self.getTransitionAt(start)
+            if previous is not None:
+                transitions.insert(0, previous)
+
+            # Integer keys of the local and UTC times of each transition
+            result = (
+                [transition[0].getLocalKey() for transition in transitions],
+                [transition[1].getLocalKey() for transition in transitions],
+                [transition[3] for transition in transitions],
+                [self.formatDescriptor(transition[4], transition[3]) for transition in transitions],
+            )
+            self.mTransitionWindows.put(window, result)
 
+        self.mLastTransitionWindow = (window, result,)
         return result
 
-    def mergeTimezone(self, tz):
-        pass
+    def getTransitionAt(self, dt):
+        """
+        The transition (as from L{expandAll} with names) in effect at a date-time, i.e. the last one at or
+        before it, found in the same way as L{findTimezoneElement}.
+
+        @param dt: the date-time
+        @type dt: L{DateTime}
+        @return: the transition, or C{None} if there is none
+        @rtype: L{tuple}
+        """
+
+        found = None
+        dt_found = None
+        for item in self.mComponents:
+            dt_item = item.expandBelow(dt)
+            if dt >= dt_item and (found is None or dt_item > dt_found):
+                found = item
+                dt_found = dt_item
+
+        if found is None:
+            return None
+        utcdt = dt_found.duplicate()
+        utcdt.offsetSeconds(-found.getUTCOffsetFrom())
+        utcdt.setTimezoneUTC(True)
+        return (dt_found, utcdt, found.getUTCOffsetFrom(), found.getUTCOffset(), found.getTZName(),)
+
+    def getTimezoneDescriptor(self, dt):
+
+        # Get the transition closest to the time
+        localKeys, _ignore_utcKeys, _ignore_offsets, descriptors = self.getTransitionWindow(dt.getYear())
+        i = bisect_right(localKeys, dt.getOffsetKey())
+        return descriptors[i - 1] if i != 0 else ""
 
     @staticmethod
-    def tuple_bisect_right(a, x, relative_to_utc=False):
+    def formatDescriptor(tzname, tzoffset):
         """
-        Same as bisect_right except that the values being compared are the first elements
-        of a tuple.
+        The time zone descriptor for a time zone name and UTC offset: the name in parentheses,
+        or the offset if there is no name.
+
+        @param tzname: the time zone name (TZNAME)
+        @type tzname: L{str}
+        @param tzoffset: the UTC offset in seconds
+        @type tzoffset: L{int}
+        @rtype: L{str}
         """
+        if len(tzname) == 0:
+            negative = False
+            if tzoffset < 0:
+                tzoffset = -tzoffset
+                negative = True
+            result = ("+", "-")[negative]
+            hours_offset = tzoffset / (60 * 60)
+            if hours_offset < 10:
+                result += "0"
+            result += str(hours_offset)
+            mins_offset = (tzoffset / 60) % 60
+            if mins_offset < 10:
+                result += "0"
+            result += str(mins_offset)
+        else:
+            result = "("
+            result += tzname
+            result += ")"
 
-        lo = 0
-        hi = len(a)
-        while lo < hi:
-            mid = (lo + hi) // 2
-            if x < a[mid][1 if relative_to_utc else 0]:
-                hi = mid
-            else:
-                lo = mid + 1
-        return lo
+        return result
+
+    def mergeTimezone(self, tz):
+        pass
 
     def findTimezoneElement(self, dt):
         # Need to make the incoming date-time relative to the DTSTART in the
@@ -45,8 +45,6 @@ class VTimezoneElement(Component):
         self.mUTCOffset = offset if offset is not None else 0
         self.mUTCOffsetFrom = 0
         self.mRecurrences = RecurrenceSet()
-        self.mCachedExpandBelow = None
-        self.mCachedExpandBelowItems = None
 
     def duplicate(self, parent=None):
         other = super(VTimezoneElement, self).duplicate(parent=parent)
@@ -55,8 +53,6 @@ class VTimezoneElement(Component):
         other.mUTCOffset = self.mUTCOffset
         other.mUTCOffsetFrom = self.mUTCOffsetFrom
         other.mRecurrences = self.mRecurrences.duplicate()
-        other.mCachedExpandBelow = None
-        other.mCachedExpandBelowItems = None
         return other
 
     def finalise(self):
@@ -114,38 +110,33 @@ class VTimezoneElement(Component):
             # Return DTSTART even if it is newer
             return self.mStart
         else:
-            # We want to allow recurrence calculation caching to help us here
-            # as this method
-            # gets called a lot - most likely for ever increasing dt values
-            # (which will therefore
-            # invalidate the recurrence cache).
-            #
-            # What we will do is round up the date-time to the next year so
-            # that the recurrence
-            # cache is invalidated less frequently
-
-            temp = DateTime(below.getYear(), 1, 1, 0, 0, 0)
-
-            # Use cache of expansion
-            if self.mCachedExpandBelowItems is None:
-                self.mCachedExpandBelowItems = []
-            if self.mCachedExpandBelow is None:
-                self.mCachedExpandBelow = self.mStart.duplicate()
-            if temp > self.mCachedExpandBelow:
-                self.mCachedExpandBelowItems = []
-                period = Period(self.mStart, temp)
-                self.mRecurrences.expand(self.mStart, period, self.mCachedExpandBelowItems, float_offset=self.mUTCOffsetFrom)
-                self.mCachedExpandBelow = temp
-
-            if len(self.mCachedExpandBelowItems) != 0:
-                # List comes back sorted so we pick the element just less than
-                # the dt value we want
-                i = bisect_right(self.mCachedExpandBelowItems, below)
+            # Expand the years leading up to the date-time (or up to the last instance if that is
+            # earlier), going back further each time nothing is found, so that only the instances
+            # close to it need to be generated
+            year = below.getYear()
+            latest = self.getLatestInstance()
+            if latest is not None:
+                year = min(year, latest.getYear() + 1)
+            upto = DateTime(year + 1, 1, 1, 0, 0, 0)
+            years = 1
+            while True:
+                lower = DateTime(year - years, 1, 1, 0, 0, 0)
+                if lower <= self.mStart:
+                    lower = self.mStart
+                items = self.expandPeriod(lower, upto)
+
+                # List comes back sorted so we pick the element just less than the dt value
+                # we want
+                i = bisect_right(items, below)
                 if i != 0:
-                    return self.mCachedExpandBelowItems[i - 1]
+                    return items[i - 1]
+                if lower is self.mStart:
+                    break
+                years *= 4
 
+            if len(items) != 0:
                 # The first one in the list is the one we want
-                return self.mCachedExpandBelowItems[0]
+                return items[0]
 
             return self.mStart
 
@@ -174,38 +165,52 @@ class VTimezoneElement(Component):
             else:
                 return ()
         else:
-            # We want to allow recurrence calculation caching to help us here
-            # as this method
-            # gets called a lot - most likely for ever increasing dt values
-            # (which will therefore
-            # invalidate the recurrence cache).
-            #
-            # What we will do is round up the date-time to the next year so
-            # that the recurrence
-            # cache is invalidated less frequently
-
-            temp = DateTime(end.getYear(), 1, 1, 0, 0, 0)
-
-            # Use cache of expansion
-            if self.mCachedExpandBelowItems is None:
-                self.mCachedExpandBelowItems = []
-            if self.mCachedExpandBelow is None:
-                self.mCachedExpandBelow = self.mStart.duplicate()
-            if temp > self.mCachedExpandBelow:
-                self.mCachedExpandBelowItems = []
-                period = Period(self.mStart, end)
-                self.mRecurrences.expand(self.mStart, period, self.mCachedExpandBelowItems, float_offset=self.mUTCOffsetFrom)
-                self.mCachedExpandBelow = temp
-
-            if len(self.mCachedExpandBelowItems) != 0:
-                # Return them all within the range
-                results = []
-                for dt in self.mCachedExpandBelowItems:
-                    if dt >= start and dt < end:
-                        result = (dt, offsetfrom, offsetto,)
-                        if with_name:
-                            result += (self.getTZName(),)
-                        results.append(result)
-                return results
+            # Nothing to do if the instances all ended well before the range
+            latest = self.getLatestInstance()
+            if latest is not None and latest.getYear() + 1 < start.getYear():
+                return ()
 
-            return ()
+            # Return them all within the range
+            results = []
+            for dt in self.expandPeriod(max(start, self.mStart), end):
+                if dt >= start and dt < end:
+                    result = (dt, offsetfrom, offsetto,)
+                    if with_name:
+                        result += (self.getTZName(),)
+                    results.append(result)
+            return results
+
+    def getLatestInstance(self):
+        """
+        The latest date-time an instance of this component can be at (the latest of DTSTART,
+        the RDATEs and the RRULE UNTILs), or C{None} if there is no such limit.
+
+        @rtype: L{DateTime}
+        """
+        latest = self.mStart
+        for rule in self.mRecurrences.getRules():
+            if not rule.getUseUntil():
+                return None
+            if rule.getUntil() > latest:
+                latest = rule.getUntil()
+        for dt in self.mRecurrences.getDates():
+            if dt > latest:
+                latest = dt
+        for period in self.mRecurrences.getPeriods():
+            if period.getStart() > latest:
+                latest = period.getStart()
+        return latest
+
+    def expandPeriod(self, start, end):
+        """
+        The instances of this component from one date-time up to (but not including) another,
+        in time order. Only the instances near the period are generated, rather than all of
+        those from DTSTART, and none are cached (L{VTimezone} caches the transitions it needs).
+
+        @param start: the earliest instance to return
+        @type start: L{DateTime}
+        @param end: the date-time to return instances before
+        @type end: L{DateTime}
+        @rtype: L{list} of L{DateTime}
+        """
+        return list(self.mRecurrences.iterInstances(self.mStart, Period(start, end), float_offset=self.mUTCOffsetFrom))
@@ -23,6 +23,7 @@ class CalendarManager(object):
 
     def __init__(self):
         Timezone.sDefaultTimezone = Timezone()
+        Timezone.defaultChanged()
 
     def initManager(self):
         # TODO: - read in timezones from vtimezones.ics file
@@ -42,6 +43,13 @@ class CalendarManager(object):
 
     def setDefaultTimezone(self, tzid):
         Timezone.sDefaultTimezone = tzid
+        Timezone.defaultChanged()
+
+    def pinnedDefaultTimezone(self, tzid=None):
+        """
+        Context in which the default timezone is fixed (see L{Timezone.pinnedDefault}).
+        """
+        return Timezone.pinnedDefault(tzid)
 
     def getDefaultTimezoneID(self):
         if Timezone.sDefaultTimezone.getUTC():
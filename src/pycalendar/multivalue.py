@@ -69,6 +69,11 @@ class MultiValue(Value):
 
     def generate(self, os):
         try:
+            # Date-time values cache their text so can be written out in one go
+            if self.mType in (Value.VALUETYPE_DATETIME, Value.VALUETYPE_DATE):
+                os.write(",".join([iter.getText() for iter in self.mValues]))
+                return
+
             first = True
             for iter in self.mValues:
                 if first:
@@ -14,10 +14,14 @@
 #    limitations under the License.
 ##
 
+from pycalendar import utils
 from pycalendar.datetime import DateTime
+from pycalendar.duration import Duration
 from pycalendar.icalendar.calendar import Calendar
 from pycalendar.parser import ParserContext
 from pycalendar.timezone import Timezone
+import bisect
+import pickle
 import unittest
 
 
@@ -394,3 +398,136 @@ END:VCALENDAR
         dt.setWeekNo(1)
         self.assertEqual(dt, DateTime(2016, 1, 8, 0, 0, 0, tzid=Timezone(utc=True)))
         self.assertEqual(dt.getWeekNo(), 1)
+
+    def testSlots(self):
+
+        dt = DateTime(2014, 3, 9, 2, 30, 0, tzid=Timezone(tzid="America/New_York"))
+        self.assertFalse(hasattr(dt, "__dict__"))
+        self.assertRaises(AttributeError, setattr, dt, "mOther", 1)
+
+        # Copies and pickles keep all the attributes
+        for copied in (dt.duplicate(), pickle.loads(pickle.dumps(dt)), pickle.loads(pickle.dumps(dt, 2))):
+            self.assertEqual(copied, dt)
+            self.assertEqual(copied.getText(), dt.getText())
+            self.assertEqual(copied.getTimezoneID(), "America/New_York")
+            self.assertEqual(copied.isDateOnly(), False)
+
+    def testNormaliseLarge(self):
+
+        dt = DateTime(2014, 1, 31, 9, 0, 0)
+        dt.offsetDay(100000)
+        self.assertEqual(dt.getText(), "22871116T090000")
+        dt.offsetDay(-100000)
+        self.assertEqual(dt.getText(), "20140131T090000")
+        dt.offsetMonth(-2400)
+        self.assertEqual(dt.getText(), "18140131T090000")
+        dt.offsetDay(-366)
+        self.assertEqual(dt.getText(), "18130130T090000")
+
+    def testAddDuration(self):
+
+        data = (
+            (DateTime(2014, 1, 31, 9, 0, 0), "P1D", "20140201T090000"),
+            (DateTime(2014, 1, 31, 9, 0, 0), "-P1D", "20140130T090000"),
+            (DateTime(2014, 12, 31, 23, 30, 0), "PT45M", "20150101T001500"),
+            (DateTime(2014, 3, 1, 0, 15, 0), "-PT30M", "20140228T234500"),
+            (DateTime(2016, 2, 28, 12, 0, 0), "P1DT12H", "20160301T000000"),
+            (DateTime(2014, 1, 1, 0, 0, 0), "-P1W", "20131225T000000"),
+            (DateTime(2014, 1, 31), "P1D", "20140201"),
+            (DateTime(2014, 1, 31), "PT25H", "20140201"),
+            (DateTime(2014, 1, 31), "-PT1H", "20140130"),
+        )
+
+        for dt, duration, result in data:
+            duration = Duration.parseText(duration)
+            self.assertEqual((dt + duration).getText(), result, "Failed on: %s %s" % (dt, duration,))
+            if not dt.isDateOnly():
+                self.assertEqual((dt + duration - duration).getText(), dt.getText(), "Failed on: %s %s" % (dt, duration,))
+
+        # Values that are not normalised are normalised by the addition
+        dt = DateTime(2014, 1, 31, 9, 0, 0)
+        dt.mDay = 33
+        dt.mHours = 25
+        self.assertEqual((dt + Duration.parseText("P1D")).getText(), "20140204T010000")
+
+    def testComparisonKeys(self):
+
+        utc = Timezone(utc=True)
+        dt1 = DateTime(2014, 1, 31, 9, 0, 0, tzid=utc)
+        dt2 = DateTime(2014, 1, 31, 10, 0, 0, tzid=utc)
+        self.assertTrue(dt1 < dt2)
+        self.assertTrue(dt1.getLocalKey() < dt2.getLocalKey())
+        self.assertEqual(dt1.getLocalKey() / 86400, utils.packDate(2014, 1, 31))
+
+        # Cached keys are reset when the value changes
+        dt1.offsetHours(2)
+        self.assertTrue(dt1 > dt2)
+        dt1.setYYMMDD(2013, 12, 31)
+        self.assertTrue(dt1 < dt2)
+        dt1.offsetDay(1)
+        self.assertTrue(dt1 == DateTime(2014, 1, 1, 11, 0, 0, tzid=utc))
+
+        # Time zones and date only values
+        eastern = DateTime(2014, 1, 31, 5, 0, 0, tzid=Timezone(tzid="America/New_York"))
+        self.assertEqual(eastern > dt2, eastern.getPosixTime() > dt2.getPosixTime())
+        self.assertEqual(eastern == dt2, eastern.getPosixTime() == dt2.getPosixTime())
+        self.assertTrue(eastern == DateTime(2014, 1, 31))
+        self.assertTrue(eastern < DateTime(2014, 2, 1))
+        self.assertTrue(eastern > None)
+        self.assertTrue(eastern != None)  # noqa: E711
+
+        # Sorting and bisecting
+        values = [DateTime(2014, 1, day, 12, 0, 0, tzid=utc) for day in (3, 1, 2)]
+        self.assertTrue(DateTime.sortKey(values) == DateTime.getLocalKey)
+        self.assertTrue(DateTime.sortKey(values + [DateTime(2014, 1, 1, 12, 0, 0)]) == DateTime.getLocalKey)
+        self.assertTrue(DateTime.sortKey(values + [eastern]) == DateTime.getPosixTime)
+        values.append(eastern)
+        values.sort(key=DateTime.sortKey(values))
+        self.assertEqual([value.getText() for value in values], ["20140101T120000Z", "20140102T120000Z", "20140103T120000Z", "20140131T050000"])
+        self.assertEqual(sorted(values), values)
+        self.assertEqual(bisect.bisect_left(values, DateTime(2014, 1, 2, 12, 0, 0, tzid=utc)), 1)
+
+    def testParseFixed(self):
+
+        data = (
+            ("20140131", True),
+            ("20140131T090000", True),
+            ("20140131T090000Z", True),
+            ("2014-01-31", False),
+            ("20140131T09:00:00", False),
+            ("20140131T090000+0100", False),
+            ("20140131X090000", False),
+            (" 0140131", False),
+            ("2014013a", False),
+            ("20140131T090000z", False),
+        )
+
+        for item, fixed in data:
+            dt = DateTime()
+            self.assertEqual(dt.parseFixed(item), fixed, "Failed on: %s" % (item,))
+            if fixed:
+                general = DateTime()
+                general.parseGeneral(item)
+                self.assertEqual((dt.getText(), dt.isDateOnly(), dt.utc()), (general.getText(), general.isDateOnly(), general.utc()), "Failed on: %s" % (item,))
+
+        # Values that are not fixed width use the general parser
+        self.assertEqual(DateTime.parseText("2014-01-31T09:00:00Z", fullISO=True).getText(), "20140131T090000Z")
+
+    def testTextCache(self):
+
+        dt = DateTime.parseText("20140131T090000")
+        self.assertEqual(dt.getText(), "20140131T090000")
+        dt.offsetDay(1)
+        self.assertEqual(dt.getText(), "20140201T090000")
+        dt.setTimezoneUTC(True)
+        self.assertEqual(dt.getText(), "20140201T090000Z")
+        copied = dt.duplicate()
+        dt.setDateOnly(True)
+        self.assertEqual(dt.getText(), "20140201")
+        self.assertEqual(copied.getText(), "20140201T090000Z")
+        dt.parse("20140203T100000Z")
+        self.assertEqual(dt.getText(), "20140203T100000Z")
+        self.assertEqual(DateTime.parseText("2014-02-03T10:00:00+01:00", fullISO=True).getText(), "20140203T100000+0100")
+        dt.parse(u"20140204T100000")
+        self.assertTrue(type(dt.getText()) is str)
+        self.assertEqual(dt.getText(), "20140204T100000")
@@ -0,0 +1,92 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+from __future__ import absolute_import
+
+from cStringIO import StringIO
+from pycalendar.datetime import DateTime
+from pycalendar.datetimearray import toEpochs, fromEpochs, toPyDateTimes, \
+    fromPyDateTimes
+from pycalendar.icalendar.calendar import Calendar
+from pycalendar.tests.test_timezonedb import StandardTZs
+from pycalendar.tests.utils import TestPyCalendar
+from pycalendar.timezone import Timezone
+from pycalendar.timezonedb import TimezoneDatabase
+import datetime
+
+
+class TestDateTimeArray(TestPyCalendar):
+
+    def setUp(self):
+        super(TestDateTimeArray, self).setUp()
+
+        for vtz in StandardTZs:
+            cal = Calendar()
+            TimezoneDatabase.getTimezoneDatabase()._addStandardTimezone(cal.parseComponent(StringIO(vtz)))
+
+    def test_toEpochs(self):
+        """
+        L{toEpochs} gives the same results as L{DateTime.getPosixTime}, including either side of
+        daylight saving time transitions.
+        """
+
+        for tzid in (Timezone(tzid="America/New_York"), Timezone(utc=True), Timezone(utc=False, tzid=3600), Timezone(utc=False, tzid=None)):
+            values = []
+            dt = DateTime(2013, 10, 30, 0, 30, 0, tzid=tzid)
+            for _ignore in range(600):
+                values.append(dt.duplicate())
+                dt.offsetHours(5)
+            values.append(DateTime(2014, 3, 9, tzid=tzid))
+            values.append(DateTime(1990, 1, 1, 12, 0, 0, tzid=tzid))
+
+            epochs = toEpochs(values)
+            self.assertEqual(list(epochs), [value.duplicate().getPosixTime() for value in values])
+
+        self.assertEqual(len(toEpochs([])), 0)
+        self.assertRaises(ValueError, toEpochs, [DateTime(2014, 1, 1, 0, 0, 0, tzid=Timezone(utc=True)), DateTime(2014, 1, 1, 0, 0, 0)])
+
+    def test_fromEpochs(self):
+        """
+        L{fromEpochs} creates values with the specified posix times.
+        """
+
+        tzid = Timezone(tzid="America/New_York")
+        epochs = range(1383451200, 1383451200 + 2 * 86400, 1800)
+        values = fromEpochs(epochs, tzid)
+        self.assertEqual(len(values), len(epochs))
+        for value, epoch in zip(values, epochs):
+            # The local times in the hour repeated at the end of daylight saving time are ambiguous
+            if not value.getText().startswith("20131103T01"):
+                self.assertEqual(value.getPosixTime(), epoch)
+        self.assertEqual(values[0].getText(), "20131103T000000")
+        self.assertEqual(values[2].getText(), "20131103T010000")
+        self.assertEqual(values[4].getText(), "20131103T010000")
+        self.assertEqual(values[0].getTimezoneID(), "America/New_York")
+
+        values = fromEpochs(epochs[::48], None, date_only=True)
+        self.assertEqual([value.getText() for value in values], ["20131103", "20131104"])
+
+    def test_pyDateTimes(self):
+        """
+        L{toPyDateTimes} and L{fromPyDateTimes} convert to and from UTC C{datetime} values.
+        """
+
+        tzid = Timezone(tzid="America/New_York")
+        values = [DateTime(2014, 7, 1, 12, 0, 0, tzid=tzid), DateTime(2014, 12, 1, 12, 0, 0, tzid=tzid)]
+        results = toPyDateTimes(values)
+        self.assertEqual(results, [datetime.datetime(2014, 7, 1, 16, 0, 0), datetime.datetime(2014, 12, 1, 17, 0, 0)])
+        self.assertEqual(fromPyDateTimes(results, tzid), values)
+        self.assertEqual([value.getText() for value in fromPyDateTimes(results, tzid)], ["20140701T120000", "20141201T120000"])
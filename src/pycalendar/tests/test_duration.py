@@ -65,6 +65,22 @@ class TestDuration(unittest.TestCase):
             duration = Duration().parseText(result)
             self.assertEqual(duration.getTotalSeconds(), seconds)
 
+    def testNominalExact(self):
+
+        data = (
+            ("PT0S", 0, 0),
+            ("P1DT3H2M1S", 1, 3 * 60 * 60 + 2 * 60 + 1),
+            ("-P1DT3H", -1, -3 * 60 * 60),
+            ("P2W", 14, 0),
+            ("-PT36H", 0, -36 * 60 * 60),
+        )
+
+        for text, days, seconds in data:
+            duration = Duration.parseText(text)
+            self.assertEqual(duration.getNominalDays(), days, "Failed on: %s" % (text,))
+            self.assertEqual(duration.getExactSeconds(), seconds, "Failed on: %s" % (text,))
+            self.assertEqual(days * 24 * 60 * 60 + seconds, duration.getTotalSeconds(), "Failed on: %s" % (text,))
+
     def testParseBad(self):
 
         test_bad_data = (
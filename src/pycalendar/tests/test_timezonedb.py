@@ -15,9 +15,13 @@
 ##
 
 from cStringIO import StringIO
+from pycalendar.datetime import DateTime
 from pycalendar.icalendar.calendar import Calendar
+from pycalendar.manager import CalendarManager
 from pycalendar.tests.utils import TestPyCalendar
+from pycalendar.timezone import Timezone
 from pycalendar.timezonedb import TimezoneDatabase
+from pycalendar.timezonetable import TimezoneTable, compileTimezones
 import os
 import tempfile
 
@@ -403,6 +407,85 @@ class TestTimezoneDB(TestPyCalendar):
         for tzid, result in data:
             self.assertEqual(TimezoneDatabase.isStandardTimezone(tzid), result, "Failed {}".format(tzid))
 
+    def test_pinnedDefault(self):
+        """
+        L{Timezone.pinnedDefault} resolves floating values with the pinned timezone and caches
+        their posix times only while it is pinned.
+        """
+
+        utc = DateTime(2014, 7, 1, 12, 0, 0, tzid=Timezone(utc=True)).getPosixTime()
+        dt = DateTime(2014, 7, 1, 12, 0, 0)
+
+        # Expand the timezones up front as their own components are floating
+        for tzid in ("America/New_York", "America/Los_Angeles",):
+            DateTime(2014, 7, 1, 12, 0, 0, tzid=Timezone(tzid=tzid)).getPosixTime()
+        self.assertEqual(dt.getPosixTime(), utc)
+
+        with Timezone.pinnedDefault(Timezone(tzid="America/New_York")):
+            self.assertEqual(dt.getPosixTime(), utc + 4 * 60 * 60)
+            self.assertTrue(dt.mPosixTimeCached)
+            self.assertEqual(dt.duplicate().getPosixTime(), utc + 4 * 60 * 60)
+
+            with Timezone.pinnedDefault(Timezone(tzid="America/Los_Angeles")):
+                self.assertEqual(dt.getPosixTime(), utc + 7 * 60 * 60)
+
+            self.assertEqual(dt.getPosixTime(), utc + 4 * 60 * 60)
+            dt.offsetHours(1)
+            self.assertEqual(dt.getPosixTime(), utc + 5 * 60 * 60)
+
+        self.assertEqual(dt.getPosixTime(), utc + 60 * 60)
+        self.assertEqual(Timezone.sDefaultPinned, 0)
+
+        # Changing the default timezone outside of a pinned context
+        manager = CalendarManager()
+        manager.setDefaultTimezone(Timezone(tzid="America/New_York"))
+        try:
+            self.assertEqual(dt.getPosixTime(), utc + 5 * 60 * 60)
+        finally:
+            manager.setDefaultTimezone(Timezone(utc=True))
+        self.assertEqual(dt.getPosixTime(), utc + 60 * 60)
+
+        # Creating a manager when there is no default timezone resets it to UTC
+        manager.setDefaultTimezone(Timezone(tzid="America/New_York"))
+        try:
+            self.assertEqual(dt.getPosixTime(), utc + 5 * 60 * 60)
+            Timezone.sDefaultTimezone = None
+            manager = CalendarManager()
+            self.assertEqual(dt.getPosixTime(), utc + 60 * 60)
+        finally:
+            manager.setDefaultTimezone(Timezone(utc=True))
+
+    def test_timeZoneSecondsOffset(self):
+        """
+        L{DateTime.timeZoneSecondsOffset} gives the same offsets as looking them up via
+        L{Timezone.timeZoneSecondsOffset}, either side of transitions and for date-only values.
+        """
+
+        data = (
+            (DateTime(2014, 3, 9, 1, 59, 59), -5 * 60 * 60, -5 * 60 * 60),
+            (DateTime(2014, 3, 9, 2, 0, 0), -4 * 60 * 60, -5 * 60 * 60),
+            (DateTime(2014, 3, 9, 6, 59, 59), -4 * 60 * 60, -5 * 60 * 60),
+            (DateTime(2014, 3, 9, 7, 0, 0), -4 * 60 * 60, -4 * 60 * 60),
+            (DateTime(2014, 3, 9), -4 * 60 * 60, -4 * 60 * 60),
+            (DateTime(2014, 3, 8), -5 * 60 * 60, -5 * 60 * 60),
+            (DateTime(2014, 11, 2, 1, 59, 59), -4 * 60 * 60, -4 * 60 * 60),
+            (DateTime(2014, 11, 2, 2, 0, 0), -5 * 60 * 60, -4 * 60 * 60),
+            (DateTime(2014, 11, 2, 5, 59, 59), -5 * 60 * 60, -4 * 60 * 60),
+            (DateTime(2014, 11, 2, 6, 0, 0), -5 * 60 * 60, -5 * 60 * 60),
+            (DateTime(2040, 7, 1, 12, 0, 0), -4 * 60 * 60, -4 * 60 * 60),
+        )
+
+        tzid = Timezone(tzid="America/New_York")
+        for dt, local, utc in data:
+            dt.setTimezone(tzid)
+            for relative_to_utc, result in ((False, local), (True, utc),):
+                self.assertEqual(dt.duplicate().timeZoneSecondsOffset(relative_to_utc), result, "Failed on: %s %s" % (dt, relative_to_utc,))
+                self.assertEqual(tzid.timeZoneSecondsOffset(dt, relative_to_utc), result, "Failed on: %s %s" % (dt, relative_to_utc,))
+
+        # Unknown timezones and fixed offsets
+        self.assertEqual(DateTime(2014, 3, 9, 12, 0, 0, tzid=Timezone(tzid="Unknown/Zone")).timeZoneSecondsOffset(), 0)
+        self.assertEqual(DateTime(2014, 3, 9, 12, 0, 0, tzid=Timezone(utc=False, tzid=3600)).timeZoneSecondsOffset(), 3600)
+
 
 class TestTimezoneDBCache(TestPyCalendar):
 
@@ -410,7 +493,7 @@ class TestTimezoneDBCache(TestPyCalendar):
         super(TestTimezoneDBCache, self).setUp()
 
         # Use temp dbpath
-        tmpdir = tempfile.mkdtemp()
+        tmpdir = self.tmpdir = tempfile.mkdtemp()
         TimezoneDatabase.createTimezoneDatabase(tmpdir)
 
         # Save standard components to temp directory
@@ -452,3 +535,98 @@ class TestTimezoneDBCache(TestPyCalendar):
         self.assertFalse("America/Los_Angeles" in TimezoneDatabase.getTimezoneDatabase().notstdtzcache)
         self.assertTrue("America/Cupertino" in TimezoneDatabase.getTimezoneDatabase().notstdtzcache)
         self.assertTrue("America/FooBar" in TimezoneDatabase.getTimezoneDatabase().notstdtzcache)
+
+    def test_timezoneTable(self):
+        """
+        L{TimezoneDatabase} looks up offsets from compiled L{TimezoneTable}s without loading
+        the .ics data, and the results are the same as from the VTIMEZONE itself.
+        """
+
+        self.assertEqual(compileTimezones(self.tmpdir), 2)
+        tzdb = TimezoneDatabase.getTimezoneDatabase()
+        tzdb.clear()
+
+        table = tzdb._getTimezoneTable("America/New_York")
+        self.assertTrue(table is not None)
+        self.assertTrue(table.covers(2098))
+        self.assertFalse(table.covers(2099))
+        self.assertTrue(tzdb._getTimezoneTable("America/FooBar") is None)
+
+        values = []
+        dt = DateTime(2014, 3, 1, 0, 30, 0, tzid=Timezone(tzid="America/New_York"))
+        for _ignore in range(300):
+            values.append(dt.duplicate())
+            dt.offsetHours(29)
+        values.append(DateTime(2014, 3, 9, tzid=Timezone(tzid="America/New_York")))
+        values.append(DateTime(1910, 1, 1, 0, 0, 0, tzid=Timezone(tzid="America/New_York")))
+        offsets = [(value.duplicate().timeZoneSecondsOffset(), value.duplicate().timeZoneSecondsOffset(True),) for value in values]
+        self.assertTrue("America/New_York" not in tzdb.tzcache)
+
+        # Same results from the VTIMEZONE
+        vtz = tzdb._getTimezone("America/New_York")
+        for value, (local, utc) in zip(values, offsets):
+            self.assertEqual(vtz.getTimezoneOffsetSeconds(value), local, "Failed on: %s" % (value,))
+            self.assertEqual(vtz.getTimezoneOffsetSeconds(value, True), utc, "Failed on: %s" % (value,))
+            self.assertEqual(TimezoneDatabase.getTimezoneOffsetSeconds("America/New_York", value), local, "Failed on: %s" % (value,))
+
+        # Years beyond the table use the VTIMEZONE
+        tzdb.clear()
+        self.assertEqual(DateTime(2150, 7, 1, 12, 0, 0, tzid=Timezone(tzid="America/New_York")).timeZoneSecondsOffset(), -4 * 60 * 60)
+        self.assertTrue(tzdb.tzcache["America/New_York"] is not None)
+
+        # A table older than its .ics data is not used
+        tzdb.clear()
+        tzpath = os.path.join(self.tmpdir, "America/New_York.ics")
+        os.utime(tzpath, (os.path.getmtime(tzpath) + 10,) * 2)
+        self.assertTrue(tzdb._getTimezoneTable("America/New_York") is None)
+        self.assertTrue(tzdb._getTimezoneTable("America/Los_Angeles") is not None)
+
+        # Round trip through a file
+        path = os.path.join(self.tmpdir, "test" + TimezoneTable.cSuffix)
+        table.write(path)
+        loaded = TimezoneTable.load(path, "America/New_York")
+        self.assertEqual(loaded.mMaxYear, table.mMaxYear)
+        self.assertEqual(loaded.mLocalKeys, table.mLocalKeys)
+        self.assertEqual(loaded.mUTCKeys, table.mUTCKeys)
+        self.assertEqual(loaded.mOffsets, table.mOffsets)
+        self.assertEqual(loaded.mDescriptors, table.mDescriptors)
+        self.assertEqual(loaded.mDescriptors[-1], "(EST)")
+
+        with open(path, "wb") as f:
+            f.write("Not a table")
+        self.assertTrue(TimezoneTable.load(path, "America/New_York") is None)
+
+    def test_lazyTimezone(self):
+        """
+        With compiled L{TimezoneTable}s the VTIMEZONE components of standard timezones are
+        only loaded when a calendar needs to include one.
+        """
+
+        compileTimezones(self.tmpdir)
+        tzdb = TimezoneDatabase.getTimezoneDatabase()
+        tzdb.clear()
+
+        dt = DateTime(2014, 7, 1, 12, 0, 0, tzid=Timezone(tzid="America/New_York"))
+        self.assertEqual(dt.timeZoneDescriptor(), "(EDT)")
+        self.assertEqual(DateTime(2014, 12, 1, 12, 0, 0, tzid=Timezone(tzid="America/New_York")).timeZoneDescriptor(), "(EST)")
+        self.assertEqual(dt.getPosixTime(), DateTime(2014, 7, 1, 16, 0, 0, tzid=Timezone(utc=True)).getPosixTime())
+        self.assertTrue(TimezoneDatabase.isStandardTimezone("America/New_York"))
+        self.assertFalse(TimezoneDatabase.isStandardTimezone("America/FooBar"))
+
+        # Calendars with standard VTIMEZONEs do not load them either
+        data = StandardTZs[0].replace("END:VCALENDAR", """BEGIN:VEVENT
+UID:12345-67890
+DTSTART;TZID=America/New_York:20140701T120000
+DURATION:PT1H
+DTSTAMP:20140101T000000Z
+SUMMARY:Test
+END:VEVENT
+END:VCALENDAR""")
+        cal = Calendar.parseText(data)
+        self.assertTrue(cal.stripStandardTimezones())
+        self.assertTrue("America/New_York" not in tzdb.tzcache)
+
+        # Until one is needed
+        cal.includeMissingTimezones(Calendar.ALL_TIMEZONES)
+        self.assertTrue(cal.getTimezone("America/New_York") is not None)
+        self.assertTrue(tzdb.tzcache["America/New_York"] is not None)
@@ -15,7 +15,9 @@
 ##
 
 import unittest
-from pycalendar.utils import encodeParameterValue, decodeParameterValue
+from pycalendar.utils import encodeParameterValue, decodeParameterValue, \
+    yearTable, weekNumber, dayOfWeek, LRUCache, dayOrdinal, ordinalDate, \
+    normaliseDate, daysInMonth
 
 
 class TestUtils(unittest.TestCase):
@@ -54,3 +56,114 @@ class TestUtils(unittest.TestCase):
 
         for value, decoded in data:
             self.assertEqual(decodeParameterValue(value), decoded)
+
+    def test_yearTable(self):
+        """
+        Year table values.
+        """
+
+        data = (
+            # year, leap, first day, week one start for SU, MO, TU, WE, TH, FR, SA
+            (1970, False, 4, (4, -2, -1, 0, 1, 2, 3)),
+            (2000, True, 6, (2, 3, 4, -2, -1, 0, 1)),
+            (2012, True, 0, (1, 2, 3, 4, -2, -1, 0)),
+            (2015, False, 4, (4, -2, -1, 0, 1, 2, 3)),
+            (2100, False, 5, (3, 4, -2, -1, 0, 1, 2)),
+        )
+
+        for year, leap, first_day, week_starts in data:
+            table = yearTable(year)
+            self.assertEqual(table.mLeapYear, leap, msg="Failed year: {}".format(year))
+            self.assertEqual(table.mFirstDay, first_day, msg="Failed year: {}".format(year))
+            self.assertEqual(table.mWeekOneStart, week_starts, msg="Failed year: {}".format(year))
+            self.assertTrue(yearTable(year) is table)
+
+    def test_weekNumber(self):
+        """
+        ISO week numbers, including weeks that span a year boundary.
+        """
+
+        data = (
+            ((2013, 12, 29), 52, 0),
+            ((2013, 12, 30), 1, 1),
+            ((2014, 1, 1), 1, 3),
+            ((2015, 12, 31), 53, 4),
+            ((2016, 1, 3), 53, 0),
+            ((2016, 1, 4), 1, 1),
+            ((2020, 12, 31), 53, 4),
+            ((2021, 1, 4), 1, 1),
+        )
+
+        for date, weekno, weekday in data:
+            self.assertEqual(weekNumber(*date), weekno, msg="Failed date: {}".format(date))
+            self.assertEqual(dayOfWeek(*date), weekday, msg="Failed date: {}".format(date))
+
+    def test_LRUCache(self):
+        """
+        The least recently used entry is discarded when full, and lookups are counted.
+        """
+
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.getStats(), {"hits": 3, "misses": 1, "size": 2})
+
+        cache.clear()
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.getStats(), {"hits": 0, "misses": 1, "size": 0})
+
+        # Weighted entries bound the total weight rather than the number of entries
+        cache = LRUCache(10)
+        cache.put("a", [1] * 4, 4)
+        cache.put("b", [2] * 5, 5)
+        self.assertEqual(cache.getWeight(), 9)
+        cache.put("c", [3] * 3, 3)
+        self.assertEqual(cache.get("a"), None)
+        self.assertEqual(cache.getWeight(), 8)
+        cache.put("b", [2], 1)
+        self.assertEqual(cache.getWeight(), 4)
+        cache.put("d", [4] * 11, 11)
+        self.assertEqual(cache.get("d"), None)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.getWeight(), 4)
+
+    def test_dayOrdinal(self):
+        """
+        Day numbers are consecutive, including across the change of leap year rules after 1752.
+        """
+
+        self.assertEqual(dayOrdinal(1, 1, 1), 1)
+        for year in (1, 4, 1699, 1700, 1752, 1753, 1800, 1900, 1970, 2000, 2100, 9999):
+            for month, day in ((1, 1), (2, 28), (2, 29), (3, 1), (12, 31)):
+                if day > daysInMonth(month, year):
+                    continue
+                ordinal = dayOrdinal(year, month, day)
+                self.assertEqual(ordinalDate(ordinal), (year, month, day), msg="Failed date: {}".format((year, month, day)))
+                self.assertEqual(ordinalDate(ordinal + 1), normaliseDate(year, month, day + 1), msg="Failed date: {}".format((year, month, day)))
+
+    def test_normaliseDate(self):
+        """
+        Out of range months and days, however large.
+        """
+
+        data = (
+            ((2015, 1, 31), (2015, 1, 31)),
+            ((2015, 14, 1), (2016, 2, 1)),
+            ((2015, 1, 0), (2014, 12, 31)),
+            ((2015, 0, 1), (2014, 12, 1)),
+            ((2016, 2, 30), (2016, 3, 1)),
+            ((1700, 2, 29), (1700, 2, 29)),
+            ((1800, 2, 29), (1800, 3, 1)),
+            ((2014, 1, 10001), (2041, 5, 19)),
+            ((2014, 1, -10000), (1986, 8, 15)),
+            ((2014, -25, 1), (2011, 11, 1)),
+        )
+
+        for date, result in data:
+            self.assertEqual(normaliseDate(*date), result, msg="Failed date: {}".format(date))
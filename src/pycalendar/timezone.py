@@ -14,6 +14,7 @@
 #    limitations under the License.
 ##
 
+from contextlib import contextmanager
 from pycalendar import stringutils
 from pycalendar.timezonedb import TimezoneDatabase
 
@@ -30,6 +31,13 @@ class Timezone(object):
     sDefaultTimezone = None
     UTCTimezone = None
 
+    # Values that depend on the default timezone (e.g. the posix time of a floating DateTime)
+    # can only be cached while it is pinned (see L{pinnedDefault}). The generation changes
+    # whenever the default timezone is changed, pinned or unpinned, so that anything cached
+    # with an earlier default can be detected.
+    sDefaultPinned = 0
+    sDefaultGeneration = 0
+
     def __init__(self, utc=None, tzid=None):
 
         if utc is not None:
@@ -50,6 +58,37 @@ class Timezone(object):
     def duplicate(self):
         return Timezone(self.mUTC, self.mTimezone)
 
+    @staticmethod
+    def defaultChanged():
+        Timezone.sDefaultGeneration += 1
+
+    @staticmethod
+    @contextmanager
+    def pinnedDefault(tzid=None):
+        """
+        Context in which the default timezone, used to resolve floating values, is fixed so
+        that values resolved with it can be cached. The default timezone must not be changed
+        within the context, other than by nesting another one. e.g.::
+
+            with Timezone.pinnedDefault(Timezone(tzid="America/New_York")):
+                instances.sort(key=lambda x: x.getPosixTime())
+
+        @param tzid: the default timezone to use within the context, or C{None} to keep the
+            current one
+        @type tzid: L{Timezone}
+        """
+        old_default = Timezone.sDefaultTimezone
+        if tzid is not None:
+            Timezone.sDefaultTimezone = tzid
+        Timezone.sDefaultPinned += 1
+        Timezone.defaultChanged()
+        try:
+            yield Timezone.sDefaultTimezone
+        finally:
+            Timezone.sDefaultPinned -= 1
+            Timezone.sDefaultTimezone = old_default
+            Timezone.defaultChanged()
+
     def equals(self, comp):
         # Always match if any one of them is 'floating'
         if self.floating() or comp.floating():
@@ -23,6 +23,11 @@ class TimezoneDatabase(object):
     """
     On demand timezone database cache. This scans a TZdb directory for .ics files matching a
     TZID and caches the component data in a calendar from whence the actual component is returned.
+
+    UTC offsets and descriptors are looked up from a compiled L{TimezoneTable} when the
+    directory has one for the TZID (see L{pycalendar.timezonetable}), so that the .ics file
+    does not have to be parsed and expanded. The component is then only loaded if it is
+    actually needed (e.g. to be included in a calendar).
     """
 
     sTimezoneDatabase = None
@@ -42,6 +47,7 @@ class TimezoneDatabase(object):
         self.dbpath = None
         self.calendar = Calendar()
         self.tzcache = {}
+        self.tablecache = {}
         self.stdtzcache = set()
         self.notstdtzcache = set()
 
@@ -52,6 +58,7 @@ class TimezoneDatabase(object):
         from pycalendar.icalendar.calendar import Calendar
         self.calendar = Calendar()
         self.tzcache.clear()
+        self.tablecache.clear()
         self.stdtzcache.clear()
         self.notstdtzcache.clear()
 
@@ -65,6 +72,10 @@ class TimezoneDatabase(object):
     def getTimezone(tzid):
         return TimezoneDatabase.getTimezoneDatabase()._getTimezone(tzid)
 
+    @staticmethod
+    def getTimezoneTable(tzid):
+        return TimezoneDatabase.getTimezoneDatabase()._getTimezoneTable(tzid)
+
     @staticmethod
     def getTimezoneInCalendar(tzid):
         """
@@ -82,17 +93,48 @@ class TimezoneDatabase(object):
 
     @staticmethod
     def getTimezoneOffsetSeconds(tzid, dt, relative_to_utc=False):
+        # Use a compiled table if there is one
+        tzdb = TimezoneDatabase.getTimezoneDatabase()
+        table = tzdb._getTimezoneTable(tzid)
+        if table is not None and table.covers(dt.getYear()):
+            return table.getTimezoneOffsetSeconds(dt, relative_to_utc)
+
         # Cache it first
-        tz = TimezoneDatabase.getTimezone(tzid)
+        tz = tzdb._getTimezone(tzid)
         if tz is not None:
             return tz.getTimezoneOffsetSeconds(dt, relative_to_utc)
         else:
             return 0
 
+    @staticmethod
+    def getTimezoneOffsetSecondsForKey(tzid, key, year, relative_to_utc=False):
+        """
+        Same as L{getTimezoneOffsetSeconds} but for a date-time given by its offset key (see
+        L{VTimezone.getTimezoneOffsetSecondsForKey}).
+        """
+
+        # Use a compiled table if there is one
+        tzdb = TimezoneDatabase.getTimezoneDatabase()
+        table = tzdb._getTimezoneTable(tzid)
+        if table is not None and table.covers(year):
+            return table.getTimezoneOffsetSecondsForKey(key, relative_to_utc)
+
+        tz = tzdb._getTimezone(tzid)
+        if tz is not None:
+            return tz.getTimezoneOffsetSecondsForKey(key, year, relative_to_utc)
+        else:
+            return 0
+
     @staticmethod
     def getTimezoneDescriptor(tzid, dt):
+        # Use a compiled table if there is one
+        tzdb = TimezoneDatabase.getTimezoneDatabase()
+        table = tzdb._getTimezoneTable(tzid)
+        if table is not None and table.covers(dt.getYear()):
+            return table.getTimezoneDescriptor(dt)
+
         # Cache it first
-        tz = TimezoneDatabase.getTimezone(tzid)
+        tz = tzdb._getTimezone(tzid)
         if tz is not None:
             return tz.getTimezoneDescriptor(dt)
         else:
@@ -125,6 +167,33 @@ class TimezoneDatabase(object):
         else:
             raise NoTimezoneInDatabase(self.dbpath, tzid)
 
+    def loadTimezoneTable(self, tzid):
+        """
+        Load the compiled table for the specified timezone identifier, if the database has one
+        that is not older than the timezone's .ics file.
+
+        @param tzid: the timezone identifier to load
+        @type tzid: L{str}
+        @return: the table, or C{None} if there is no valid table
+        @rtype: L{TimezoneTable}
+        """
+
+        from pycalendar.timezonetable import TimezoneTable
+
+        if self.dbpath is None or not isinstance(tzid, basestring):
+            return None
+
+        tzpath = os.path.normpath(os.path.join(self.dbpath, "%s.ics" % (tzid,)))
+        tablepath = os.path.normpath(os.path.join(self.dbpath, "%s%s" % (tzid, TimezoneTable.cSuffix,)))
+        if not tablepath.startswith(self.dbpath):
+            return None
+        try:
+            if os.path.getmtime(tablepath) < os.path.getmtime(tzpath):
+                return None
+        except OSError:
+            return None
+        return TimezoneTable.load(tablepath, tzid)
+
     def addTimezone(self, tz):
         """
         Add the specified VTIMEZONE component to this object's L{Calendar} cache. This component
@@ -137,6 +206,9 @@ class TimezoneDatabase(object):
         self.calendar.addComponent(copy)
         self.tzcache[copy.getID()] = copy
 
+        # Offsets must come from this component rather than any compiled table
+        self.tablecache[copy.getID()] = None
+
     def _addStandardTimezone(self, tz):
         """
         Same as L{addTimezone} except that the timezone is marked as a standard timezone. This
@@ -164,6 +236,10 @@ class TimezoneDatabase(object):
             return True
         elif tzid in self.notstdtzcache:
             return False
+        elif self._getTimezoneTable(tzid) is not None:
+            # Only standard timezones have compiled tables
+            self.stdtzcache.add(tzid)
+            return True
         else:
             self._getTimezone(tzid)
             return tzid in self.stdtzcache
@@ -193,6 +269,23 @@ class TimezoneDatabase(object):
 
         return self.tzcache[tzid]
 
+    def _getTimezoneTable(self, tzid):
+        """
+        Get the compiled table for the specified timezone identifier, loading it from the
+        tz database if not already cached.
+
+        @param tzid: the timezone identifier to lookup
+        @type tzid: L{str}
+        @return: the table, or C{None} if there is none
+        @rtype: L{TimezoneTable}
+        """
+        try:
+            return self.tablecache[tzid]
+        except KeyError:
+            table = self.loadTimezoneTable(tzid)
+            self.tablecache[tzid] = table
+            return table
+
     @staticmethod
     def mergeTimezones(cal, tzs):
         """
@@ -214,5 +307,5 @@ class TimezoneDatabase(object):
         If the supplied VTIMEZONE is not in our cache then store it in memory.
         """
 
-        if self._getTimezone(tz.getID()) is None:
+        if self._getTimezoneTable(tz.getID()) is None and self._getTimezone(tz.getID()) is None:
             self.addTimezone(tz)
@@ -0,0 +1,267 @@
+##
+#    Copyright (c) 2015 Cyrus Daboo. All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+##
+
+"""
+Compiled time zone transition tables. A table holds the transitions of a VTIMEZONE up to a
+fixed year as parallel arrays, and can be written to and read back from a binary file stored
+alongside the .ics file of the zone in a timezone database directory. Looking up an offset in
+a table needs neither the .ics data to be parsed nor its sub-components to be expanded.
+
+To compile the tables for all the zones in a timezone database directory:
+
+    python -m pycalendar.timezonetable [options] DIR
+"""
+
+from array import array
+from bisect import bisect_right
+from pycalendar.datetime import DateTime
+import getopt
+import os
+import struct
+import sys
+
+
+class TimezoneTable(object):
+    """
+    The transitions of a time zone up to (but not including) the start of a fixed year. For
+    each transition the table has the local (L{DateTime.getLocalKey}) keys of the local and UTC
+    times it happens at, the UTC offset from then on, and the time zone descriptor (as given by
+    L{VTimezone.getTimezoneDescriptor}) from then on.
+    """
+
+    # Suffix of compiled table files
+    cSuffix = ".tzb"
+
+    # File header: magic, format version, max year, number of transitions, descriptor bytes
+    cMagic = "PYCALTZB"
+    cVersion = 1
+    cHeader = struct.Struct("<8sIIII")
+
+    # Keys are stored as doubles (which hold them exactly) and offsets as 32-bit integers, both
+    # little-endian
+    cKeyTypecode = "d"
+    cOffsetTypecode = "i"
+
+    # Default year to compile transitions up to
+    cDefaultMaxYear = 2100
+
+    def __init__(self, tzid, maxYear, localKeys, utcKeys, offsets, descriptors):
+        self.mTZID = tzid
+        self.mMaxYear = maxYear
+        self.mLocalKeys = localKeys
+        self.mUTCKeys = utcKeys
+        self.mOffsets = offsets
+        self.mDescriptors = descriptors
+
+    @classmethod
+    def fromTimezone(cls, vtz, maxYear=None):
+        """
+        Compile the transitions of a VTIMEZONE.
+
+        @param vtz: the time zone to compile
+        @type vtz: L{VTimezone}
+        @param maxYear: the year to compile transitions up to, or C{None} for the default
+        @type maxYear: L{int}
+        @rtype: L{TimezoneTable}
+        """
+
+        if maxYear is None:
+            maxYear = cls.cDefaultMaxYear
+        localKeys = array(cls.cKeyTypecode)
+        utcKeys = array(cls.cKeyTypecode)
+        offsets = array(cls.cOffsetTypecode)
+        descriptors = []
+        for transition in vtz.expandAll(None, DateTime(maxYear, 1, 1, 0, 0, 0)):
+            localKeys.append(transition[0].getLocalKey())
+            utcKeys.append(transition[1].getLocalKey())
+            offsets.append(transition[3])
+            descriptors.append(vtz.getTimezoneDescriptor(transition[0]))
+        return cls(vtz.getID(), maxYear, localKeys, utcKeys, offsets, descriptors)
+
+    @classmethod
+    def load(cls, path, tzid):
+        """
+        Read a compiled table from a file.
+
+        @param path: the file to read
+        @type path: L{str}
+        @param tzid: the time zone identifier of the table
+        @type tzid: L{str}
+        @return: the table, or C{None} if the file is not a valid table
+        @rtype: L{TimezoneTable}
+        """
+
+        try:
+            with open(path, "rb") as f:
+                magic, version, maxYear, count, length = cls.cHeader.unpack(f.read(cls.cHeader.size))
+                if magic != cls.cMagic or version != cls.cVersion:
+                    return None
+                localKeys = array(cls.cKeyTypecode)
+                localKeys.fromfile(f, count)
+                utcKeys = array(cls.cKeyTypecode)
+                utcKeys.fromfile(f, count)
+                offsets = array(cls.cOffsetTypecode)
+                offsets.fromfile(f, count)
+                descriptors = f.read(length)
+        except (IOError, EOFError, struct.error):
+            return None
+
+        if len(descriptors) != length:
+            return None
+        if sys.byteorder != "little":
+            localKeys.byteswap()
+            utcKeys.byteswap()
+            offsets.byteswap()
+        return cls(tzid, maxYear, localKeys, utcKeys, offsets, descriptors.split("\0") if count else [])
+
+    def write(self, path):
+        """
+        Write this table to a file, replacing any existing one.
+
+        @param path: the file to write
+        @type path: L{str}
+        """
+
+        descriptors = "\0".join(self.mDescriptors)
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(self.cHeader.pack(self.cMagic, self.cVersion, self.mMaxYear, len(self.mOffsets), len(descriptors)))
+            for values in (self.mLocalKeys, self.mUTCKeys, self.mOffsets,):
+                if sys.byteorder != "little":
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+            f.write(descriptors)
+        os.rename(temp, path)
+
+    def covers(self, year):
+        """
+        Whether this table has all the transitions needed for lookups of a date-time in the
+        specified year (whether the date-time is local or UTC).
+
+        @param year: the year of the date-time
+        @type year: L{int}
+        @rtype: L{bool}
+        """
+        return year < self.mMaxYear - 1
+
+    def getTimezoneOffsetSecondsForKey(self, key, relative_to_utc=False):
+        """
+        Same as L{VTimezone.getTimezoneOffsetSecondsForKey} for a date-time in a year covered
+        by this table.
+        """
+        i = bisect_right(self.mUTCKeys if relative_to_utc else self.mLocalKeys, key)
+        return self.mOffsets[i - 1] if i != 0 else 0
+
+    def getTimezoneOffsetSeconds(self, dt, relative_to_utc=False):
+        """
+        Same as L{VTimezone.getTimezoneOffsetSeconds} for a date-time in a year covered by
+        this table.
+        """
+        return self.getTimezoneOffsetSecondsForKey(dt.getOffsetKey(), relative_to_utc)
+
+    def getTimezoneDescriptor(self, dt):
+        """
+        Same as L{VTimezone.getTimezoneDescriptor} for a date-time in a year covered by this
+        table.
+        """
+        i = bisect_right(self.mLocalKeys, dt.getOffsetKey())
+        return self.mDescriptors[i - 1] if i != 0 else ""
+
+
+def compileTimezones(dbpath, maxYear=None, verbose=False):
+    """
+    Compile the table for each .ics file in a timezone database directory and write it
+    alongside the .ics file.
+
+    @param dbpath: the timezone database directory
+    @type dbpath: L{str}
+    @param maxYear: the year to compile transitions up to, or C{None} for the default
+    @type maxYear: L{int}
+    @return: the number of tables written
+    @rtype: L{int}
+    """
+
+    from pycalendar.icalendar.calendar import Calendar
+
+    count = 0
+    for root, _ignore_dirs, files in os.walk(dbpath):
+        for name in sorted(files):
+            if not name.endswith(".ics"):
+                continue
+            path = os.path.join(root, name)
+            with open(path) as f:
+                cal = Calendar()
+                vtz = cal.parseComponent(f)
+            if vtz is None:
+                continue
+            table = TimezoneTable.fromTimezone(vtz, maxYear)
+            table.write(path[:-len(".ics")] + TimezoneTable.cSuffix)
+            count += 1
+            if verbose:
+                print "Compiled %s: %d transitions" % (vtz.getID(), len(table.mOffsets),)
+    return count
+
+
+def usage(error_msg=None):
+    if error_msg:
+        print error_msg
+
+    print """Usage: timezonetable [options] DIR
+Options:
+    -h            Print this help and exit
+    -v            Print each time zone compiled
+    --end         Year to compile transitions up to
+
+Arguments:
+    DIR      Timezone database directory containing .ics files
+
+Description:
+    This utility will compile the transitions of each VTIMEZONE in a
+    timezone database directory into a binary table, written next to
+    its .ics file, that the timezone database uses to look up UTC
+    offsets without parsing and expanding the VTIMEZONE.
+
+"""
+
+    if error_msg:
+        raise ValueError(error_msg)
+    else:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+
+    maxYear = None
+    verbose = False
+
+    options, args = getopt.getopt(sys.argv[1:], "hv", ["end=", ])
+
+    for option, value in options:
+        if option == "-h":
+            usage()
+        elif option == "-v":
+            verbose = True
+        elif option == "--end":
+            maxYear = int(value)
+        else:
+            usage("Unrecognized option: %s" % (option,))
+
+    if len(args) != 1:
+        usage("Must have one argument")
+
+    count = compileTimezones(os.path.expanduser(args[0]), maxYear, verbose)
+    print "Compiled %d time zones" % (count,)
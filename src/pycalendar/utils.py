@@ -14,6 +14,8 @@
 #    limitations under the License.
 ##
 
+from bisect import bisect_left
+from collections import OrderedDict
 from pycalendar.parser import ParserContext
 import cStringIO as StringIO
 
@@ -414,6 +416,132 @@ def leapDaysSince1970(year_offset):
         return result
 
 
+class YearTable(object):
+    """
+    Calendar values for one year that are needed repeatedly when working with days of the week
+    and week numbers (e.g. when generating recurrence instances). Use L{yearTable} to get the
+    cached table for a year rather than creating one.
+    """
+
+    def __init__(self, year):
+        self.mYear = year
+        self.mLeapYear = isLeapYear(year)
+        self.mDaysInYear = 366 if self.mLeapYear else 365
+        self.mDaysInMonth = days_in_month_leap if self.mLeapYear else days_in_month
+        self.mDaysUptoMonth = days_upto_month_leap if self.mLeapYear else days_upto_month
+
+        # Days from 1st January 1970 to the 1st January of this year
+        self.mDaysSince1970 = (year - 1970) * 365 + leapDaysSince1970(year - 1970)
+
+        # Day of the week of the 1st January (01-Jan-1970 was a Thursday)
+        self.mFirstDay = (4 + self.mDaysSince1970) % 7
+
+        # Year day on which week number one starts, indexed by week start day. Week one is the
+        # first week with at least four days in the year, so it can start in the previous year
+        # (zero or negative year day).
+        week_starts = []
+        for weekstart in range(7):
+            before = (self.mFirstDay - weekstart) % 7
+            week_starts.append(1 - before if before <= 3 else 8 - before)
+        self.mWeekOneStart = tuple(week_starts)
+
+cachedYearTables = {}
+
+
+def yearTable(year):
+
+    try:
+        return cachedYearTables[year]
+    except KeyError:
+        result = cachedYearTables[year] = YearTable(year)
+        return result
+
+
+def daysSince1970(year, month, day):
+    """
+    Number of days from 1st January 1970 to the specified date. The day does not have to be
+    valid for the month (e.g. February 30th or January 0th), in which case the result is simply
+    offset from the start of the month.
+    """
+    table = yearTable(year)
+    return table.mDaysSince1970 + table.mDaysUptoMonth[month] + day - 1
+
+
+def dayOrdinal(year, month, day):
+    """
+    Number of days from 31st December 1 BC to the specified date, with the same leap years as
+    L{isLeapYear} (so unlike L{daysSince1970} consecutive days always differ by one). As with
+    L{daysSince1970}, the day does not have to be valid for the month.
+    """
+    prior = year - 1
+    leap_days = prior / 4
+    if prior > 1752:
+        leap_days -= prior / 100 - 1752 / 100
+        leap_days += prior / 400 - 1752 / 400
+    return prior * 365 + leap_days + yearTable(year).mDaysUptoMonth[month] + day
+
+
+def ordinalDate(ordinal):
+    """
+    The year, month and day for a day number from L{dayOrdinal}.
+    """
+
+    # Estimate the year, then correct for the leap years that are skipped after 1752
+    year = (ordinal - 1) * 4 / 1461 + 1
+    while dayOrdinal(year, 1, 1) > ordinal:
+        year -= 1
+    while dayOrdinal(year + 1, 1, 1) <= ordinal:
+        year += 1
+
+    table = yearTable(year)
+    day = ordinal - dayOrdinal(year, 1, 1) + 1
+    month = bisect_left(table.mDaysUptoMonth, day) - 1
+    return year, month, day - table.mDaysUptoMonth[month]
+
+
+def normaliseDate(year, month, day):
+    """
+    Normalise year, month and day values (e.g. 2015-14-01 becomes 2016-02-01, and 2015-01-00
+    becomes 2014-12-31). This takes the same time however far out of range the values are.
+    """
+
+    # Adjust the month first, since the day adjustment is month dependent
+    year += (month - 1) / 12
+    month = ((month - 1) % 12) + 1
+
+    if 0 < day <= 28 or 0 < day <= yearTable(year).mDaysInMonth[month]:
+        return year, month, day
+    return ordinalDate(dayOrdinal(year, month, day))
+
+
+def dayOfWeek(year, month, day):
+    """
+    Day of the week (0 = Sunday) of the specified date. As with L{daysSince1970}, the day does
+    not have to be valid for the month.
+    """
+    table = yearTable(year)
+    return (table.mFirstDay + table.mDaysUptoMonth[month] + day - 1) % 7
+
+
+def weekNumber(year, month, day):
+    """
+    ISO week number (i.e. with weeks starting on Monday) of the specified date.
+    """
+    table = yearTable(year)
+    week_no = (table.mDaysUptoMonth[month] + day - table.mWeekOneStart[1]) // 7 + 1
+
+    # Might need to adjust forward/backwards based on year boundaries
+    if week_no == 0:
+        # Last week of previous year
+        week_no = weekNumber(year - 1, 12, 31)
+    elif week_no == 53:
+        # Might be first week of next year (if that starts on MO, TU, WE or TH)
+        if yearTable(year + 1).mFirstDay in (1, 2, 3, 4):
+            week_no = 1
+
+    return week_no
+
+
 # Packed date
 def packDate(year, month, day):
     return (year << 16) | (month << 8) | (day + 128)
@@ -518,3 +646,76 @@ def set_difference(v1, v2):
     s2 = set(v2)
     s3 = s1.difference(s2)
     return list(s3)
+
+
+class LRUCache(object):
+    """
+    A size-bounded mapping that discards the least recently used entry when full. Lookups are
+    counted so the effectiveness of the cache can be monitored.
+
+    By default the size is the number of entries. Entries can instead be given a weight (e.g.
+    the number of items in a cached list) when they are added, in which case the size bounds
+    the total weight of the entries, and an entry heavier than the whole cache is not kept.
+    """
+
+    def __init__(self, size):
+        self.mSize = size
+        self.mItems = OrderedDict()
+        self.mWeights = {}
+        self.mWeight = 0
+        self.mHits = 0
+        self.mMisses = 0
+
+    def __len__(self):
+        return len(self.mItems)
+
+    def get(self, key, default=None):
+        try:
+            value = self.mItems.pop(key)
+        except KeyError:
+            self.mMisses += 1
+            return default
+        self.mItems[key] = value
+        self.mHits += 1
+        return value
+
+    def put(self, key, value, weight=1):
+        if key in self.mItems:
+            del self.mItems[key]
+            self.mWeight -= self.mWeights.pop(key)
+        if weight > self.mSize:
+            return
+        self.mItems[key] = value
+        self.mWeights[key] = weight
+        self.mWeight += weight
+        while self.mWeight > self.mSize:
+            oldest, _ignore_value = self.mItems.popitem(last=False)
+            self.mWeight -= self.mWeights.pop(oldest)
+
+    def getWeight(self):
+        """
+        The total weight of the entries (the number of entries if no weights were given).
+
+        @rtype: L{int}
+        """
+        return self.mWeight
+
+    def clear(self):
+        self.mItems.clear()
+        self.mWeights.clear()
+        self.mWeight = 0
+        self.mHits = 0
+        self.mMisses = 0
+
+    def getStats(self):
+        """
+        The usage of the cache.
+
+        @return: the hit and miss counts and number of entries
+        @rtype: L{dict}
+        """
+        return {
+            "hits": self.mHits,
+            "misses": self.mMisses,
+            "size": len(self.mItems),
+        }
@@ -24,6 +24,9 @@ class ValueMixin(object):
     Mix-in for operations common to Value's and value-specific classes.
     """
 
+    # No per-instance attributes here so that value classes can use __slots__
+    __slots__ = ()
+
     def __str__(self):
         return self.getText()
 